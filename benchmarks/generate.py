@@ -0,0 +1,288 @@
+"""
+Generates synthetic architectures and template libraries, seeded from the example templates
+"""
+
+import argparse
+import os
+import random
+
+import yaml
+
+from src.tags import RefTag, architecture_dumper, architecture_loader
+
+SEED_DIR: str = "example"
+SEED_TEMPLATES: str = os.path.join(SEED_DIR, "templates")
+SEED_ARCHITECTURE: str = os.path.join(SEED_DIR, "architecture.yaml")
+
+# property that every generated template accepts to add references between components
+FANOUT_PROPERTY: str = "dependsOn"
+
+
+def platform_names(count: int, seeds: list[str]) -> dict[str, str]:
+    """
+    Returns `count` platform names mapped to the seed platform they are copied from
+    """
+    names: dict[str, str] = {}
+    for i in range(count):
+        seed = seeds[i % len(seeds)]
+        copy = i // len(seeds)
+        names[f"{seed}{copy + 1}" if copy > 0 else seed] = seed
+    return names
+
+
+def referenced_types(rules: dict) -> set[str]:
+    """
+    Returns the component types referenced by a cerberus schema
+    """
+    types: set[str] = set()
+    if "ref_type" in rules:
+        types.add(rules["ref_type"])
+    for nested in rules.get("schema", {}).values():
+        types |= referenced_types(nested)
+    return types
+
+
+def ordered_types(definitions: dict[str, dict]) -> list[str]:
+    """
+    Orders the template types so that referenced types come first
+    """
+    dependencies = {
+        name: referenced_types({"schema": definition["spec"]["properties"]})
+        for name, definition in definitions.items()
+    }
+    ordered: list[str] = []
+    while len(ordered) < len(dependencies):
+        ready = [
+            name
+            for name, needs in dependencies.items()
+            if name not in ordered and needs <= set(ordered)
+        ]
+        if not ready:
+            raise ValueError(
+                f"Cyclic references between seed templates: {dependencies}"
+            )
+        ordered.extend(ready)
+    return ordered
+
+
+def padding(lines: int) -> str:
+    """
+    Returns template code that makes a template `lines` lines longer
+    """
+    if lines <= 0:
+        return ""
+    body = "".join(
+        f'  {{{{ resourceId | replace("-", "_") }}}}_padding_{i} = "{{{{ resourceId }}}}-{i}"\n'
+        for i in range(lines)
+    )
+    return f"\nlocals {{\n{body}}}\n"
+
+
+def fanout_snippet() -> str:
+    """
+    Returns template code that uses the fan-out references
+    """
+    return (
+        f"{{% for name, target in ({FANOUT_PROPERTY} or {{}}).items() %}}\n"
+        "# {{ name }} -> {{ target }}\n"
+        "{% endfor %}\n"
+    )
+
+
+def generate_templates(
+    out_dir: str, platforms: dict[str, str], template_lines: int
+) -> dict[str, dict]:
+    """
+    Copies the seed templates for every platform, returning the definitions by template type
+    """
+    with open(os.path.join(SEED_TEMPLATES, "root.yaml"), encoding="utf8") as file:
+        root = yaml.safe_load(file)
+
+    definitions: dict[str, dict] = {}
+    specials = [root["spec"]["main"], root["spec"]["versions"]]
+    for template in specials + root["spec"]["templates"]:
+        template_type = template.replace("/", "")
+        is_component = template not in specials
+        source_dir = os.path.join(SEED_TEMPLATES, template_type)
+        target_dir = os.path.join(out_dir, "templates", template_type)
+        os.makedirs(target_dir, exist_ok=True)
+
+        with open(os.path.join(source_dir, "definition.yaml"), encoding="utf8") as file:
+            definition = yaml.safe_load(file)
+
+        seed_files: dict[str, list[str]] = {}
+        for platform in definition["spec"]["platforms"]:
+            if isinstance(platform, str):
+                seed_files[platform] = [platform]
+            else:
+                seed_files.update(platform)
+
+        generated_platforms: list = []
+        for name, seed in platforms.items():
+            files = [x.replace(seed, name, 1) for x in seed_files[seed]]
+            for seed_file, file in zip(seed_files[seed], files):
+                with open(
+                    os.path.join(source_dir, f"{seed_file}.tf.j2"), encoding="utf8"
+                ) as stream:
+                    contents = stream.read()
+                if is_component:
+                    contents += fanout_snippet() + padding(template_lines)
+                with open(
+                    os.path.join(target_dir, f"{file}.tf.j2"), "w", encoding="utf8"
+                ) as stream:
+                    stream.write(contents)
+            generated_platforms.append(name if files == [name] else {name: files})
+        definition["spec"]["platforms"] = generated_platforms
+
+        if is_component:
+            definition["spec"].setdefault("properties", {})[FANOUT_PROPERTY] = {
+                "type": "dict",
+                "required": False,
+                "valuesrules": {"type": "reference"},
+            }
+            definitions[template_type] = definition
+
+        with open(
+            os.path.join(target_dir, "definition.yaml"), "w", encoding="utf8"
+        ) as file:
+            yaml.safe_dump(definition, file, sort_keys=False)
+
+    with open(
+        os.path.join(out_dir, "templates", "root.yaml"), "w", encoding="utf8"
+    ) as file:
+        yaml.safe_dump(root, file, sort_keys=False)
+
+    return definitions
+
+
+def fill_properties(
+    schema: dict, name: str, by_type: dict[str, list[str]], rng: random.Random
+) -> dict:
+    """
+    Creates values for the required properties of a cerberus schema
+    """
+    properties: dict = {}
+    for field, rules in schema.items():
+        # optional nested properties are filled as well, as some platforms require them
+        if not rules.get("required", False) and "schema" not in rules:
+            continue
+        if rules["type"] == "reference":
+            properties[field] = RefTag(rng.choice(by_type[rules["ref_type"]]))
+        elif rules["type"] == "dict":
+            properties[field] = fill_properties(rules["schema"], name, by_type, rng)
+        elif "allowed" in rules:
+            properties[field] = rng.choice(rules["allowed"])
+        else:
+            properties[field] = f"{name}-{field.lower()}"
+    return properties
+
+
+def generate_architecture(
+    out_dir: str,
+    definitions: dict[str, dict],
+    platforms: dict[str, str],
+    components: int,
+    fanout: int,
+    seed: int,
+) -> None:
+    """
+    Writes an architecture with `components` components that each reference `fanout` earlier components
+    """
+    rng = random.Random(seed)
+    with open(SEED_ARCHITECTURE, encoding="utf8") as file:
+        architecture = yaml.load(file, Loader=architecture_loader())
+    seed_platforms = {x["name"]: x for x in architecture["spec"]["platforms"]}
+
+    # referenced types come first, so every reference can point to an earlier component
+    types = ordered_types(definitions)
+
+    by_type: dict[str, list[str]] = {x: [] for x in types}
+    names: list[str] = []
+    generated: list[dict] = []
+    for i in range(components):
+        template_type = types[i % len(types)]
+        name = f"{template_type}-{i}"
+        properties = fill_properties(
+            definitions[template_type]["spec"]["properties"], name, by_type, rng
+        )
+        if fanout > 0 and names:
+            properties[FANOUT_PROPERTY] = {
+                f"dep{j}": RefTag(target)
+                for j, target in enumerate(rng.sample(names, min(fanout, len(names))))
+            }
+        generated.append(
+            {"name": name, "type": template_type, "properties": properties}
+        )
+        by_type[template_type].append(name)
+        names.append(name)
+
+    architecture["metadata"]["name"] = f"synthetic-{components}"
+    architecture["spec"] = {
+        "platforms": [
+            {"name": name, "properties": dict(seed_platforms[seed]["properties"])}
+            for name, seed in platforms.items()
+        ],
+        "components": generated,
+    }
+
+    with open(os.path.join(out_dir, "architecture.yaml"), "w", encoding="utf8") as file:
+        yaml.dump(architecture, file, Dumper=architecture_dumper(), sort_keys=False)
+
+
+def generate(
+    out_dir: str,
+    components: int,
+    platforms: int = 2,
+    fanout: int = 1,
+    template_lines: int = 0,
+    seed: int = 0,
+) -> str:
+    """
+    Generates an architecture and its template library into `out_dir`, returning the architecture path
+    """
+    with open(SEED_ARCHITECTURE, encoding="utf8") as file:
+        seeds = [
+            x["name"]
+            for x in yaml.load(file, Loader=architecture_loader())["spec"]["platforms"]
+        ]
+
+    names = platform_names(platforms, seeds)
+    definitions = generate_templates(out_dir, names, template_lines)
+    generate_architecture(out_dir, definitions, names, components, fanout, seed)
+    return os.path.join(out_dir, "architecture.yaml")
+
+
+def main() -> None:
+    """
+    Entrypoint of the generator
+    """
+    parser = argparse.ArgumentParser(description="Generates a synthetic architecture")
+    parser.add_argument("--output", "-o", required=True, help="the output directory")
+    parser.add_argument("--components", "-n", type=int, default=100)
+    parser.add_argument("--platforms", "-p", type=int, default=2)
+    parser.add_argument(
+        "--fanout", "-f", type=int, default=1, help="references per component"
+    )
+    parser.add_argument(
+        "--template-lines",
+        "-l",
+        type=int,
+        default=0,
+        help="lines added to every component template",
+    )
+    parser.add_argument("--seed", "-s", type=int, default=0)
+    args = parser.parse_args()
+
+    path = generate(
+        args.output,
+        args.components,
+        args.platforms,
+        args.fanout,
+        args.template_lines,
+        args.seed,
+    )
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Benchmarks the phases of a transpilation on synthetic architectures
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from loguru import logger
+
+from src import utils
+from src.architecture import ArchitectureConfig
+from src.common import create_environment
+from src.schema import Schema
+from src.sink import DirectorySink
+from src.tags import architecture_loader
+from src.template import TemplateRoot
+from src.transpiler import (
+    TEMPLATE_ROOT_FILE,
+    collect_jobs,
+    read_templates,
+    validate_components,
+)
+from src.validator import ArchitectureValidator
+
+from .generate import generate
+
+PHASES: list[str] = ["load", "validate", "render", "write"]
+RESULTS_DIR: str = os.path.join("benchmarks", "results")
+
+
+def timed(function: Callable[[], any]) -> tuple[float, any]:
+    """
+    Runs a function, returning the elapsed seconds and its result
+    """
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def run_once(architecture_file: str, template_dir: str, out_dir: str) -> dict:
+    """
+    Transpiles an architecture once, returning the seconds spent in every phase
+    """
+    timings: dict[str, float] = {}
+
+    def load() -> tuple:
+        schema_registry = Schema.load_all()
+        root = TemplateRoot.with_schema_registry(
+            os.path.join(template_dir, TEMPLATE_ROOT_FILE), schema_registry
+        )
+        templates = read_templates(template_dir, root, schema_registry)
+        data = utils.load_yaml(architecture_file, architecture_loader())
+        return schema_registry, templates, data
+
+    timings["load"], (schema_registry, templates, data) = timed(load)
+    template_registry, special_registry = templates
+
+    def validate() -> tuple:
+        schema = schema_registry[ArchitectureConfig.SCHEMA_NAME]
+        success, errors = utils.validate(
+            data, None, schema.validator(ArchitectureValidator)
+        )
+        if not success:
+            raise ValueError(f"Invalid architecture: {errors}")
+        architecture = ArchitectureConfig(data.get("metadata"), data["spec"])
+        if architecture.check_naming_collisions() or architecture.dangling_references():
+            raise ValueError("Invalid references in the architecture")
+        validate_components(architecture, architecture.components(), template_registry)
+        jobs = collect_jobs(
+            architecture, architecture.platforms(), architecture.components()
+        )
+        return architecture, jobs
+
+    timings["validate"], (architecture, jobs) = timed(validate)
+
+    env = create_environment()
+    registry = template_registry | special_registry
+    timings["render"], rendered = timed(
+        lambda: [
+            (job, registry[job.template_type].render(job.platform, env, job.data))
+            for job in jobs
+        ]
+    )
+
+    def write() -> int:
+        count = 0
+        with DirectorySink(
+            out_dir, [x["name"] for x in architecture.platforms()]
+        ) as sink:
+            for job, files in rendered:
+                for file in files:
+                    name, status, entry = file.save(sink, job.platform, job.name)
+                    sink.record(job.platform, name, status, entry)
+                    count += 1
+            sink.finish()
+        return count
+
+    timings["write"], files = timed(write)
+    timings["total"] = sum(timings[x] for x in PHASES)
+    return {"timings": timings, "outputFiles": files}
+
+
+def run_config(config: dict, repeat: int, work_dir: str) -> dict:
+    """
+    Generates the architecture of a configuration and benchmarks it `repeat` times,
+    keeping the fastest time of every phase
+    """
+    source_dir = os.path.join(work_dir, "source")
+    shutil.rmtree(source_dir, ignore_errors=True)
+    architecture_file = generate(source_dir, **config)
+    template_dir = os.path.join(source_dir, "templates")
+
+    runs: list[dict] = []
+    for _ in range(repeat):
+        out_dir = os.path.join(work_dir, "out")
+        shutil.rmtree(out_dir, ignore_errors=True)
+        runs.append(run_once(architecture_file, template_dir, out_dir))
+
+    return {
+        "config": config,
+        "outputFiles": runs[0]["outputFiles"],
+        "timings": {
+            phase: min(x["timings"][phase] for x in runs)
+            for phase in PHASES + ["total"]
+        },
+    }
+
+
+def git_commit() -> Optional[str]:
+    """
+    Returns the current commit, if the benchmark runs inside a git checkout
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, results: dict) -> None:
+    """
+    Prints the relative change of every phase against a baseline result file
+    """
+    previous = {json.dumps(x["config"], sort_keys=True): x for x in baseline["results"]}
+    print(f"compared to {baseline.get('commit') or 'baseline'}:")
+    for result in results["results"]:
+        key = json.dumps(result["config"], sort_keys=True)
+        if key not in previous:
+            continue
+        changes = ", ".join(
+            f"{phase} {result['timings'][phase] / previous[key]['timings'][phase] - 1:+.1%}"
+            for phase in PHASES + ["total"]
+            if previous[key]["timings"][phase] > 0
+        )
+        print(f"  {result['config']}: {changes}")
+
+
+def main() -> None:
+    """
+    Entrypoint of the benchmark harness
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks multiform")
+    parser.add_argument(
+        "--components",
+        "-n",
+        type=int,
+        nargs="+",
+        default=[100, 1000],
+        help="the component counts to benchmark",
+    )
+    parser.add_argument("--platforms", "-p", type=int, nargs="+", default=[2])
+    parser.add_argument("--fanout", "-f", type=int, nargs="+", default=[1])
+    parser.add_argument("--template-lines", "-l", type=int, nargs="+", default=[0])
+    parser.add_argument("--repeat", "-r", type=int, default=3)
+    parser.add_argument(
+        "--output",
+        "-o",
+        default=None,
+        help="the result file, defaults to benchmarks/results/<commit>.json",
+    )
+    parser.add_argument(
+        "--compare", "-c", default=None, help="a result file to compare against"
+    )
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    configs = [
+        {
+            "components": components,
+            "platforms": platforms,
+            "fanout": fanout,
+            "template_lines": lines,
+        }
+        for components in args.components
+        for platforms in args.platforms
+        for fanout in args.fanout
+        for lines in args.template_lines
+    ]
+
+    results: dict = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="multiform-bench-") as work_dir:
+        for config in configs:
+            result = run_config(config, args.repeat, work_dir)
+            results["results"].append(result)
+            timings = ", ".join(
+                f"{phase} {seconds * 1000:.1f} ms"
+                for phase, seconds in result["timings"].items()
+            )
+            print(f"{config} -> {result['outputFiles']} files: {timings}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{results['commit'] or 'results'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf8") as file:
+        json.dump(results, file, indent=2)
+    print(f"saved results to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf8") as file:
+            compare(json.load(file), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Measures the import time of every subcommand with `python -X importtime` and checks it against a budget
+"""
+
+import argparse
+import subprocess
+import sys
+from typing import Optional
+
+# the modules every subcommand imports, in addition to the entrypoint
+COMMANDS: dict[str, list[str]] = {
+    "cli": ["src.main"],
+    "transpile": ["src.main", "src.session"],
+    "compile-templates": ["src.main", "src.transpiler"],
+    "check-templates": ["src.main", "src.check"],
+    "watch": ["src.main", "src.watch"],
+    "serve": ["src.main", "src.serve"],
+    "plot": ["src.main", "src.graph"],
+    "cache": ["src.main", "src.cache"],
+}
+
+# import time budgets in milliseconds, as measured by -X importtime, which adds some overhead
+BUDGETS: dict[str, float] = {
+    "cli": 200,
+    "transpile": 400,
+    "compile-templates": 400,
+    "check-templates": 400,
+    "watch": 400,
+    "serve": 400,
+    "plot": 500,
+    "cache": 400,
+}
+
+# modules a subcommand must never import
+FORBIDDEN: dict[str, list[str]] = {
+    "cli": ["jinja2", "cerberus", "yaml", "pygraphviz"],
+    "transpile": ["pygraphviz", "concurrent.futures.process"],
+    "compile-templates": ["pygraphviz", "concurrent.futures.process"],
+    "check-templates": ["pygraphviz", "concurrent.futures.process"],
+    "watch": ["pygraphviz"],
+    "serve": ["pygraphviz"],
+    "cache": ["pygraphviz", "cerberus"],
+    "plot": ["pygraphviz", "concurrent.futures.process"],
+}
+
+
+def measure(modules: list[str]) -> Optional[tuple[float, set[str]]]:
+    """
+    Imports the modules in a fresh interpreter, returning the import time in milliseconds
+    and the names of all imported modules, or None if the import failed
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if process.returncode != 0:
+        return None
+
+    total = 0
+    imported: set[str] = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        imported.add(name.strip())
+        # only top level imports, the cumulative time of nested imports is already included
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return total / 1000, imported
+
+
+def main() -> None:
+    """
+    Entrypoint of the startup benchmark
+    """
+    parser = argparse.ArgumentParser(description="Checks the startup time of multiform")
+    parser.add_argument(
+        "--repeat",
+        "-r",
+        type=int,
+        default=5,
+        help="the number of measurements, the fastest one is used",
+    )
+    parser.add_argument(
+        "--scale",
+        "-s",
+        type=float,
+        default=1.0,
+        help="multiplies all budgets, e.g. for slow CI machines",
+    )
+    args = parser.parse_args()
+
+    failed = False
+    for command, modules in COMMANDS.items():
+        measurements = [measure(modules) for _ in range(args.repeat)]
+        if None in measurements:
+            # a broken import would break the subcommand, so it fails the check
+            print(f"{command}: failed, could not import {', '.join(modules)}")
+            failed = True
+            continue
+
+        milliseconds = min(x[0] for x in measurements)
+        budget = BUDGETS[command] * args.scale
+        forbidden = sorted(
+            x
+            for x in FORBIDDEN.get(command, [])
+            if any(name == x or name.startswith(f"{x}.") for name in measurements[0][1])
+        )
+
+        status = "ok"
+        if milliseconds > budget:
+            status = "over budget"
+        if forbidden:
+            status = f"imports {', '.join(forbidden)}"
+        failed |= status != "ok"
+        print(f"{command}: {milliseconds:.1f} ms (budget {budget:.0f} ms) {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ Setuptools definition
 """
 
 import os
+import re
 from setuptools import setup
 
 # utility function to read the readme
@@ -10,22 +11,27 @@ def read(fname):
     """reads a file"""
     return open(os.path.join(os.path.dirname(__file__), fname), encoding="UTF-8").read()
 
+# utility function to read the version without importing the package
+def version():
+    """reads the version from src/__init__.py"""
+    return re.search(r'__version__ = "(.+)"', read(os.path.join("src", "__init__.py"))).group(1)
+
 setup(
     name="multiform",
-    version="1.0.0",
+    version=version(),
     author="Michael Lohr",
     author_email="michael@lohr.dev",
     description=("A Multi-Cloud Templating System"),
     long_description=read('README.md'),
     license="MIT",
     packages=['src'],
+    package_data={'src': ['schemas/*.yaml']},
     install_requires=[
         "loguru     == 0.6.0",
         "PyYAML     ==   6.0",
         "Jinja2     == 3.1.1",
         "MarkupSafe == 2.1.1",
         "Cerberus   == 1.3.4",
-        "pygraphviz ==   1.9",
     ],
     entry_points={
         "console_scripts": ["multiform=src.main:main"]
@@ -0,0 +1,49 @@
+"""
+A Multi-Cloud Templating System
+
+The Python API is imported on first use, so that the CLI starts quickly.
+"""
+
+from typing import TYPE_CHECKING, Any
+
+__version__ = "1.0.0"
+
+if TYPE_CHECKING:
+    # the names of the lazily imported API, for type checkers and linters
+    from .errors import (
+        ArchitectureError,
+        BatchError,
+        ConfigError,
+        MultiformError,
+        SchemaError,
+        TemplateError,
+        UsageError,
+    )
+    from .session import Multiform
+    from .tags import RefTag
+    from .transpiler import TranspileOptions
+
+# public name -> module that defines it
+__api__: dict[str, str] = {
+    "Multiform": "session",
+    "TranspileOptions": "transpiler",
+    "RefTag": "tags",
+    "MultiformError": "errors",
+    "ConfigError": "errors",
+    "SchemaError": "errors",
+    "ArchitectureError": "errors",
+    "TemplateError": "errors",
+    "UsageError": "errors",
+    "BatchError": "errors",
+}
+
+__all__ = list(__api__)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in __api__:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from importlib import import_module
+
+    return getattr(import_module(f".{__api__[name]}", __name__), name)
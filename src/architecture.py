@@ -4,12 +4,15 @@ Contains the architecture class
 
 from __future__ import annotations
 
-from collections import Counter
+from collections import Counter, deque
 from typing import Optional, Tuple, Union
 
 from . import utils
+from .cache import ArchitectureCache
 from .config import YamlConfig
-from .tags import RefTag, architecture_loader
+from .errors import ConfigError
+from .include import load_architecture_file
+from .tags import RefTag
 from .validator import ArchitectureValidator
 
 
@@ -22,6 +25,20 @@ class ArchitectureConfig(YamlConfig):
 
     def __init__(self, metadata: Optional[dict], spec: dict) -> None:
         super().__init__(metadata, spec)
+        # name -> component, the first component wins on naming collisions
+        self.index: dict[str, dict] = {}
+        # name -> (field, referenced name) for every `!ref` of the component
+        self.graph: dict[str, list[Tuple[str, str]]] = {}
+        # the architecture file and the files it includes, if it was loaded from files
+        self.files: list[str] = []
+        for component in self.components():
+            self.index.setdefault(component["name"], component)
+            self.graph.setdefault(component["name"], []).extend(
+                (field, tag.value)
+                for field, tag in utils.get_type_occurences(
+                    component.get("properties") or {}, RefTag
+                )
+            )
 
     def platforms(self) -> list[dict]:
         """
@@ -43,16 +60,101 @@ class ArchitectureConfig(YamlConfig):
         counter = Counter(names)
         return [i for i, j in counter.items() if j > 1]
 
+    def references(self, name: str) -> list[str]:
+        """
+        Returns the names of the components that are referenced by a component
+        """
+        return [target for _, target in self.graph.get(name, [])]
+
+    def dangling_references(self) -> list[Tuple[str, str, str]]:
+        """
+        Returns the references to components that do not exist as (component, field, referenced name)
+        """
+        return [
+            (name, field, target)
+            for name, refs in self.graph.items()
+            for field, target in refs
+            if target not in self.index
+        ]
+
+    def reference_cycles(self) -> list[str]:
+        """
+        Returns the names of the components that are part of or depend on a reference cycle
+        """
+        pending: dict[str, int] = {
+            name: len({x for x in self.references(name) if x in self.index})
+            for name in self.graph
+        }
+        dependents: dict[str, list[str]] = {name: [] for name in self.graph}
+        for name in self.graph:
+            for target in {x for x in self.references(name) if x in self.index}:
+                dependents[target].append(name)
+
+        # components are resolved once everything they reference is resolved, cycles never are
+        ready: deque[str] = deque(name for name, count in pending.items() if count == 0)
+        while ready:
+            for dependent in dependents[ready.popleft()]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    ready.append(dependent)
+
+        return [name for name in self.graph if pending[name] > 0]
+
+    def select(
+        self, names: Optional[list[str]] = None, types: Optional[list[str]] = None
+    ) -> list[dict]:
+        """
+        Returns the components with the given names or types together with all components they reference,
+        in the order of the architecture. Returns all components if neither names nor types are given.
+        """
+        if not names and not types:
+            return self.components()
+
+        pending: list[str] = [
+            x["name"]
+            for x in self.components()
+            if x["name"] in (names or []) or x["type"] in (types or [])
+        ]
+        selected: set[str] = set()
+        while pending:
+            name = pending.pop()
+            if name in selected or name not in self.index:
+                continue
+            selected.add(name)
+            pending.extend(self.references(name))
+
+        return [x for x in self.components() if x["name"] in selected]
+
     @staticmethod
     def with_schema_registry(
-        path: str, schema_registry: dict[str, dict]
+        path: str,
+        schema_registry: dict[str, dict],
+        cache: Optional[ArchitectureCache] = None,
+        workers: int = 1,
+    ) -> ArchitectureConfig:
+        """
+        Parses the architecture file and the files it includes from a path, see `load_architecture_file`
+        """
+        data, files = load_architecture_file(
+            path, schema_registry[ArchitectureConfig.SCHEMA_NAME], cache, workers
+        )
+
+        architecture = ArchitectureConfig(data.get("metadata"), data["spec"])
+        architecture.files = files
+        return architecture
+
+    @staticmethod
+    def from_data(
+        data: dict, schema_registry: dict[str, dict], source: str = "architecture"
     ) -> ArchitectureConfig:
         """
-        Parses the architecture file from a path
+        Creates the architecture from already parsed data, e.g. a dict built in Python
         """
         schema: dict = schema_registry[ArchitectureConfig.SCHEMA_NAME]
-        data: dict = utils.load_yaml_and_validate_handle_errors(
-            path, schema.spec, architecture_loader(), ArchitectureValidator()
+        success, errors = utils.validate(
+            data, None, schema.validator(ArchitectureValidator)
         )
+        if not success:
+            raise ConfigError(f"Error parsing '{source}': {errors}", source)
 
         return ArchitectureConfig(data.get("metadata"), data["spec"])
@@ -0,0 +1,162 @@
+"""
+Contains the bundle format that stores validated and compiled templates in a single file
+"""
+
+import importlib.util
+import marshal
+import os
+
+import jinja2
+from loguru import logger
+
+from .errors import TemplateError
+from .template import TemplateDefinition, TemplateFile, TemplateRoot
+
+# bundles start with this line, followed by the marshalled payload
+BUNDLE_MAGIC: bytes = b"MULTIFORM-BUNDLE\n"
+BUNDLE_FORMAT: int = 2
+BUNDLE_EXTENSION: str = ".mfb"
+
+
+def is_bundle(path: str) -> bool:
+    """
+    Checks if the path points to a template bundle instead of a template directory
+    """
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as file:
+        return file.read(len(BUNDLE_MAGIC)) == BUNDLE_MAGIC
+
+
+def dump_template(template: TemplateFile, env: jinja2.Environment) -> dict:
+    """
+    Compiles a template file to Python code and returns it in the bundle format
+    """
+    source: str = env.compile(template.contents, filename=template.path, raw=True)
+    return {
+        "path": template.path,
+        "templateType": template.template_type,
+        "platform": template.platform,
+        "contents": template.contents,
+        "source": source,
+        "code": marshal.dumps(compile(source, template.path, "exec")),
+        "variables": sorted(template.used_variables()),
+    }
+
+
+def dump_definition(definition: TemplateDefinition, env: jinja2.Environment) -> dict:
+    """
+    Returns a validated template definition in the bundle format
+    """
+    return {
+        "metadata": definition.metadata,
+        "spec": definition.spec,
+        "templateType": definition.template_type,
+        "files": {
+            platform: [dump_template(x, env) for x in files]
+            for platform, files in definition.template_files.items()
+        },
+    }
+
+
+def write_bundle(
+    out_file: str,
+    root: TemplateRoot,
+    template_registry: dict[str, TemplateDefinition],
+    special_registry: dict[str, TemplateDefinition],
+) -> None:
+    """
+    Compiles the validated templates and writes them into a bundle
+    """
+    logger.info("Compiling templates...")
+    env = jinja2.Environment(loader=jinja2.BaseLoader())
+    payload: dict = {
+        "format": BUNDLE_FORMAT,
+        "jinja": jinja2.__version__,
+        "python": importlib.util.MAGIC_NUMBER,
+        "root": {"metadata": root.metadata, "spec": root.spec},
+        "templates": {
+            name: dump_definition(x, env) for name, x in template_registry.items()
+        },
+        "specials": {
+            name: dump_definition(x, env) for name, x in special_registry.items()
+        },
+    }
+
+    logger.info(f"Saving bundle to {out_file}...")
+    with open(out_file, "wb") as file:
+        file.write(BUNDLE_MAGIC)
+        marshal.dump(payload, file)
+
+
+def load_template(data: dict, precompiled: bool, python: bool) -> TemplateFile:
+    """
+    Creates a template file from the bundle format
+    """
+    template = TemplateFile(
+        data["path"], data["templateType"], data["platform"], data["contents"]
+    )
+    template.variables = frozenset(data["variables"])
+    if precompiled:
+        if python:
+            template.code = marshal.loads(data["code"])
+        else:
+            template.code = compile(data["source"], data["path"], "exec")
+    return template
+
+
+def load_definition(data: dict, precompiled: bool, python: bool) -> TemplateDefinition:
+    """
+    Creates a template definition from the bundle format
+    """
+    return TemplateDefinition(
+        None,
+        data["metadata"],
+        data["spec"],
+        data["templateType"],
+        {
+            platform: [load_template(x, precompiled, python) for x in files]
+            for platform, files in data["files"].items()
+        },
+    )
+
+
+def load_bundle(
+    path: str,
+) -> tuple[TemplateRoot, dict[str, TemplateDefinition], dict[str, TemplateDefinition]]:
+    """
+    Loads a bundle, returning the template root, the component templates and the special templates
+
+    The templates were validated when the bundle was compiled, so they are not validated again.
+    """
+    logger.info(f"Loading template bundle {path}...")
+    with open(path, "rb") as file:
+        file.read(len(BUNDLE_MAGIC))
+        try:
+            payload: dict = marshal.load(file)
+        except (EOFError, ValueError, TypeError) as err:
+            raise TemplateError(f"'{path}' is not a valid template bundle") from err
+
+    if payload.get("format") != BUNDLE_FORMAT:
+        raise TemplateError(
+            f"'{path}' has bundle format {payload.get('format')}, expected {BUNDLE_FORMAT}. Compile the templates again."
+        )
+
+    # the generated code only runs on the Jinja version that generated it
+    precompiled = payload["jinja"] == jinja2.__version__
+    if not precompiled:
+        logger.warning(
+            f"'{path}' was compiled with Jinja {payload['jinja']}, compiling the templates again"
+        )
+    python = payload["python"] == importlib.util.MAGIC_NUMBER
+
+    root = TemplateRoot(None, payload["root"]["metadata"], payload["root"]["spec"])
+    template_registry = {
+        name: load_definition(x, precompiled, python)
+        for name, x in payload["templates"].items()
+    }
+    special_registry = {
+        name: load_definition(x, precompiled, python)
+        for name, x in payload["specials"].items()
+    }
+    return root, template_registry, special_registry
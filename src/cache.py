@@ -0,0 +1,298 @@
+"""
+Contains the caches used to speed up repeated transpilations
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from typing import Optional
+
+import jinja2
+from loguru import logger
+
+from .report import encode_json
+from .writer import write_file
+
+# folder of the caches that are shared between runs, see `user_cache_dir`
+CACHE_FOLDER: str = "multiform"
+# default size limit of the render cache in megabytes
+RENDER_CACHE_SIZE: int = 512
+
+
+def user_cache_dir() -> str:
+    """
+    Returns the folder for caches shared between runs, following the XDG base directory specification
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, CACHE_FOLDER)
+
+
+class CacheStats:
+    """
+    Counts the hits and misses of a cache
+    """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self) -> None:
+        """
+        Records a cache hit
+        """
+        self.hits += 1
+
+    def miss(self) -> None:
+        """
+        Records a cache miss
+        """
+        self.misses += 1
+
+    def as_dict(self) -> dict:
+        """
+        Returns the counters in the format used by the report
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def since(self, before: dict) -> dict:
+        """
+        Returns what was counted since `before` was taken with `as_dict`
+        """
+        return {key: count - before[key] for key, count in self.as_dict().items()}
+
+    def add(self, counts: dict) -> None:
+        """
+        Adds the counters of another process, as returned by `since`
+        """
+        self.hits += counts["hits"]
+        self.misses += counts["misses"]
+
+
+class TemplateBytecodeCache(jinja2.FileSystemBytecodeCache):
+    """
+    Stores compiled templates on disk, keyed by the hash of the template contents
+    """
+
+    def __init__(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(directory, "%s.jinja")
+
+    def get_cache_key(self, name: str, filename: str = None) -> str:
+        # `name` already is the content hash of the template
+        return name
+
+
+class ArchitectureCache:
+    """
+    Stores parsed and validated architecture files on disk, keyed by the hash of the file
+    """
+
+    def __init__(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    @staticmethod
+    def key(contents: bytes, schema: any) -> str:
+        """
+        Returns the cache key of an architecture file, which also covers the schema it was validated with
+        """
+        digest = hashlib.sha256(contents)
+        digest.update(pickle.dumps(schema))
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        """
+        Returns the cache file of a key
+        """
+        return os.path.join(self.directory, f"{key}.architecture")
+
+    def get(self, key: str) -> Optional[any]:
+        """
+        Returns the cached architecture or None
+        """
+        try:
+            with open(self.path(key), "rb") as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as err:
+            logger.debug(f"Ignoring cached architecture {self.path(key)}: {err}")
+            return None
+
+    def set(self, key: str, architecture: any) -> None:
+        """
+        Caches an architecture
+        """
+        # write to a temporary file first, so concurrent runs never read partial caches
+        temp_file = f"{self.path(key)}.{os.getpid()}"
+        try:
+            with open(temp_file, "wb") as file:
+                pickle.dump(architecture, file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, self.path(key))
+        except OSError as err:
+            logger.debug(f"Could not cache the architecture in {self.path(key)}: {err}")
+
+
+def default_render_cache() -> str:
+    """
+    Returns the folder of the render cache that is used if none is given
+    """
+    return os.path.join(user_cache_dir(), "renders")
+
+
+class RenderCache:
+    """
+    Stores rendered files on disk, keyed by the hash of the template and the hash of the data it was rendered with
+
+    Every entry is a file with the rendered contents. Hits update the modification time of the
+    entry, so `prune` can evict the least recently used entries once the cache exceeds `max_size` bytes.
+    """
+
+    def __init__(
+        self, directory: str, max_size: int = RENDER_CACHE_SIZE * 1024 * 1024
+    ) -> None:
+        self.directory = directory
+        self.max_size = max_size
+
+    @staticmethod
+    def context_key(data: dict) -> Optional[str]:
+        """
+        Returns the canonical hash of the data a template is rendered with,
+        or None if the data contains values that cannot be hashed reliably
+        """
+        try:
+            canonical = json.dumps(
+                [jinja2.__version__, data],
+                sort_keys=True,
+                separators=(",", ":"),
+                default=encode_json,
+            )
+        except (TypeError, ValueError):
+            return None
+        return hashlib.sha256(canonical.encode("utf8")).hexdigest()
+
+    @staticmethod
+    def key(checksum: str, context: str) -> str:
+        """
+        Returns the cache key of a template, given its content hash, and a context from `context_key`
+        """
+        return hashlib.sha256(f"{checksum}:{context}".encode("utf8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        """
+        Returns the cache file of a key, spread over subfolders to keep folders small
+        """
+        return os.path.join(self.directory, key[:2], f"{key}.render")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached contents or None, marking the entry as recently used
+        """
+        path = self.path(key)
+        try:
+            with open(path, "rb") as file:
+                contents = file.read().decode("utf8")
+            os.utime(path)
+            return contents
+        except FileNotFoundError:
+            return None
+        except (OSError, UnicodeDecodeError) as err:
+            logger.debug(f"Ignoring cached render {path}: {err}")
+            return None
+
+    def set(self, key: str, contents: str) -> None:
+        """
+        Caches rendered contents
+        """
+        path = self.path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # written atomically, so concurrent runs never read partial entries
+            write_file(path, contents.encode("utf8"))
+        except OSError as err:
+            logger.debug(f"Could not cache the render in {path}: {err}")
+
+    def entries(self) -> list[os.DirEntry]:
+        """
+        Returns the files of all cached entries
+        """
+        entries: list[os.DirEntry] = []
+        if not os.path.isdir(self.directory):
+            return entries
+        with os.scandir(self.directory) as folders:
+            for folder in folders:
+                if not folder.is_dir():
+                    continue
+                with os.scandir(folder.path) as files:
+                    entries += [x for x in files if x.name.endswith(".render")]
+        return entries
+
+    def stats(self) -> dict:
+        """
+        Returns the number of entries, their size and the size limit in bytes
+        """
+        entries = self.entries()
+        return {
+            "entries": len(entries),
+            "size": sum(x.stat().st_size for x in entries),
+            "maxSize": self.max_size,
+        }
+
+    def prune(self) -> int:
+        """
+        Evicts the least recently used entries until the cache fits its size limit, returning the number of evicted entries
+        """
+        entries = []
+        for entry in self.entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        size = sum(x[1] for x in entries)
+        if size <= self.max_size:
+            return 0
+
+        evicted = 0
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            evicted += 1
+        logger.debug(f"Evicted {evicted} entries from the render cache")
+        return evicted
+
+    def clear(self) -> int:
+        """
+        Removes all entries, returning their number
+        """
+        entries = self.entries()
+        for entry in entries:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+        return len(entries)
+
+
+def manage_render_cache(action: str, directory: Optional[str], max_size: int) -> None:
+    """
+    Reports the stats of the render cache, evicts entries beyond `max_size` megabytes or clears it
+    """
+    cache = RenderCache(directory or default_render_cache(), max_size * 1024 * 1024)
+    if action == "clear":
+        logger.success(f"Removed {cache.clear()} entries from {cache.directory}")
+    elif action == "prune":
+        logger.success(f"Evicted {cache.prune()} entries from {cache.directory}")
+    else:
+        stats = cache.stats()
+        logger.info(f"Render cache: {cache.directory}")
+        logger.info(f"Entries: {stats['entries']}")
+        logger.info(f"Size: {stats['size'] / 1024 / 1024:.1f} MB of {max_size} MB")
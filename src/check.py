@@ -0,0 +1,132 @@
+"""
+Contains the static analysis of the templates, which checks the variables they use without rendering them
+"""
+
+import difflib
+from typing import Optional
+
+from loguru import logger
+
+from .architecture import ArchitectureConfig
+from .common import load_architecture
+from .errors import TemplateError
+from .schema import Schema, SchemaRegistry
+from .template import ANALYSIS_ENV, TemplateDefinition
+from .transpiler import COMPONENT_VARIABLES, load_templates
+
+
+def check_templates(template_dir: str, architecture: Optional[str] = None) -> None:
+    """
+    Reports the variables the templates use but that are not declared in the properties of their
+    definition, raising a TemplateError if there are any
+
+    Templates also get the metadata, the platform properties and, for components, the variables in
+    `COMPONENT_VARIABLES`. Platform properties are only known with an `architecture`, without one
+    the remaining variables are reported as the platform properties the templates expect, see
+    `check_expected`.
+    """
+    logger.info("Reading and validating schemas...")
+    schema_registry: SchemaRegistry = Schema.load_all()
+    _, template_registry, special_registry = load_templates(
+        template_dir, schema_registry
+    )
+
+    # the metadata and the globals of jinja are available to every template
+    common: set[str] = set(ANALYSIS_ENV.globals) | set(
+        schema_registry[ArchitectureConfig.SCHEMA_NAME].spec["metadata"]["schema"]
+    )
+    platforms: Optional[dict[str, set[str]]] = None
+    if architecture:
+        config: ArchitectureConfig = load_architecture(architecture, schema_registry)
+        common |= set(config.metadata or {})
+        platforms = {
+            x["name"]: set(x.get("properties") or {}) for x in config.platforms()
+        }
+
+    problems: list[str] = []
+    # (template, path, platform, declared properties, undeclared variables) of every template file
+    missing: list[tuple[str, str, str, set[str], set[str]]] = []
+    count = 0
+    for name, definition in (template_registry | special_registry).items():
+        declared: set[str] = set(definition.spec.get("properties") or {})
+        provided = common | declared
+        if name in template_registry:
+            provided |= set(COMPONENT_VARIABLES)
+
+        used: set[str] = set()
+        for platform, files in definition.template_files.items():
+            for template in files:
+                count += 1
+                variables = template.used_variables()
+                used |= variables
+                logger.debug(f"{template.path}: {', '.join(sorted(variables))}")
+
+                if platforms is None:
+                    missing.append(
+                        (name, template.path, platform, declared, variables - provided)
+                    )
+                    continue
+                problems += [
+                    f"{template.path}: `{x}` is neither a property of `{name}` nor of platform `{platform}`"
+                    for x in sorted(
+                        variables - provided - platforms.get(platform, set())
+                    )
+                ]
+
+        check_unused(definition, declared - used)
+
+    if platforms is None:
+        problems += check_expected(missing, set(special_registry))
+
+    if problems:
+        raise TemplateError(f"Found {len(problems)} undeclared variables", problems)
+    logger.success(f"Checked the variables of {count} templates")
+
+
+def check_expected(
+    missing: list[tuple[str, str, str, set[str], set[str]]], specials: set[str]
+) -> list[str]:
+    """
+    Warns about the platform properties the templates expect without an architecture, returning the
+    problems of the variables no platform is expected to supply
+
+    The platform keys are the variables of the special templates, which only get the metadata and
+    the platform properties, and the variables that templates of several types share. A variable that
+    is none of these but close to a declared property of its template is most likely a misspelled
+    property, which the components of the template can never supply.
+    """
+    users: dict[tuple[str, str], set[str]] = {}
+    for name, _, platform, _, variables in missing:
+        for variable in variables:
+            users.setdefault((platform, variable), set()).add(name)
+
+    problems: list[str] = []
+    expected: dict[str, set[str]] = {}
+    for name, path, platform, declared, variables in missing:
+        for variable in sorted(variables):
+            names = users[(platform, variable)]
+            matches = difflib.get_close_matches(
+                variable, declared | set(COMPONENT_VARIABLES), 1
+            )
+            if len(names) == 1 and not names & specials and matches:
+                problems.append(
+                    f"{path}: `{variable}` is not a property of `{name}`, did you mean `{matches[0]}`?"
+                )
+            else:
+                expected.setdefault(platform, set()).add(variable)
+
+    for platform, variables in sorted(expected.items()):
+        logger.warning(
+            f"Templates for `{platform}` expect the platform properties: {', '.join(sorted(variables))}"
+        )
+    return problems
+
+
+def check_unused(definition: TemplateDefinition, unused: set[str]) -> None:
+    """
+    Warns about properties that are declared but not used by any template
+    """
+    if unused:
+        logger.warning(
+            f"`{definition.template_type}` declares properties that no template uses: {', '.join(sorted(unused))}"
+        )
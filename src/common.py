@@ -2,17 +2,21 @@
 Contains common functionality, required by multiple subcommands
 """
 
-from typing import Tuple
+from typing import Optional, Tuple
 
 import jinja2
 from loguru import logger
 
 from .architecture import ArchitectureConfig
+from .cache import ArchitectureCache, TemplateBytecodeCache
+from .errors import ArchitectureError
 from .schema import Schema, SchemaRegistry
 
 
 def init(
     architecture: str,
+    template_cache: Optional[str] = None,
+    architecture_cache: Optional[str] = None,
 ) -> Tuple[jinja2.Environment, SchemaRegistry, ArchitectureConfig]:
     """
     Initialization routine for the transpiler and graph subcommands
@@ -20,38 +24,80 @@ def init(
     logger.info("Initializing...")
 
     # setup templating engine
-    env = jinja2.Environment(
-        loader=jinja2.BaseLoader(),
-    )
+    env = create_environment(template_cache)
 
     # read & validate schemas
     logger.info("Reading and validation schemas...")
     schema_registry: SchemaRegistry = Schema.load_all()
 
-    return env, schema_registry, load_architecture(architecture, schema_registry)
+    return (
+        env,
+        schema_registry,
+        load_architecture(architecture, schema_registry, architecture_cache),
+    )
+
+
+def create_environment(template_cache: Optional[str] = None) -> jinja2.Environment:
+    """
+    Creates the templating engine, optionally persisting compiled templates in `template_cache`
+    """
+    return jinja2.Environment(
+        loader=jinja2.BaseLoader(),
+        bytecode_cache=(
+            TemplateBytecodeCache(template_cache) if template_cache else None
+        ),
+    )
 
 
 def load_architecture(
-    architecture: str, schema_registry: SchemaRegistry
+    architecture: str,
+    schema_registry: SchemaRegistry,
+    architecture_cache: Optional[str] = None,
+    workers: int = 1,
 ) -> ArchitectureConfig:
     """
-    Loads and validates the architecture
+    Loads and validates the architecture, optionally reusing the parsed files from `architecture_cache`
+
+    With several `workers`, the files the architecture includes are parsed in parallel.
     """
     logger.info("Loading user-provided architecture definition file...")
 
-    # load architecture definition
-    architecture: ArchitectureConfig = ArchitectureConfig.with_schema_registry(
-        architecture, schema_registry
+    architecture = ArchitectureConfig.with_schema_registry(
+        architecture,
+        schema_registry,
+        ArchitectureCache(architecture_cache) if architecture_cache else None,
+        workers,
     )
 
+    check_architecture(architecture)
+    return architecture
+
+
+def check_architecture(architecture: ArchitectureConfig) -> None:
+    """
+    Checks that the component names are unique and that all references can be resolved
+    """
     logger.info("Validating architecture")
 
     # check for naming collisions
     collisions: list[str] = architecture.check_naming_collisions()
     if len(collisions) >= 1:
-        logger.error(
+        raise ArchitectureError(
             f"Found architecture component name collisions (names have to be unique): {collisions}"
         )
-        exit(1)
 
-    return architecture
+    # check that every reference points to an existing component
+    dangling: list[Tuple[str, str, str]] = architecture.dangling_references()
+    if len(dangling) >= 1:
+        raise ArchitectureError(
+            "Found references to unknown components",
+            [
+                f"Component '{component}' references unknown component '{target}' in field '{field}'"
+                for component, field, target in dangling
+            ],
+        )
+
+    # references are dependencies of the generated resources, which must not form a cycle
+    cyclic = architecture.reference_cycles()
+    if len(cyclic) >= 1:
+        logger.warning(f"Found components with cyclic references: {cyclic}")
@@ -0,0 +1,71 @@
+"""
+Contains the errors raised by multiform
+"""
+
+from typing import Optional
+
+from loguru import logger
+
+
+class MultiformError(Exception):
+    """
+    Base class of all errors, `errors` holds the individual problems if there are several
+    """
+
+    def __init__(self, message: str, errors: Optional[list[str]] = None) -> None:
+        super().__init__(message)
+        self.errors = errors or []
+
+
+class ConfigError(MultiformError):
+    """
+    A YAML file is missing, cannot be parsed or does not match its schema
+    """
+
+    def __init__(
+        self,
+        message: str,
+        path: Optional[str] = None,
+        errors: Optional[list[str]] = None,
+    ) -> None:
+        super().__init__(message, errors)
+        self.path = path
+
+
+class SchemaError(MultiformError):
+    """
+    A schema is invalid
+    """
+
+
+class ArchitectureError(MultiformError):
+    """
+    The architecture is inconsistent, e.g. a component references an unknown component or has invalid properties
+    """
+
+
+class TemplateError(MultiformError):
+    """
+    A template or template bundle cannot be loaded or rendered
+    """
+
+
+class UsageError(MultiformError):
+    """
+    The given options cannot be used together or select something that does not exist
+    """
+
+
+class BatchError(MultiformError):
+    """
+    Some architectures of a batch failed, `errors` holds their paths
+    """
+
+
+def log_error(err: MultiformError) -> None:
+    """
+    Logs an error together with its individual problems
+    """
+    logger.error(str(err))
+    for problem in err.errors:
+        logger.error(f"  {problem}")
@@ -1,38 +1,244 @@
 """
-Generates a Graphviz graph of the given architecture
+Generates a graph of the given architecture as DOT or JSON, optionally rendered with Graphviz
 """
-import pygraphviz as pgv
+
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Iterator, Optional, TextIO
+
 from loguru import logger
 
-from . import utils
 from .architecture import ArchitectureConfig
 from .common import init
-from .tags import RefTag
+from .errors import UsageError
+from .plot_options import GRAPH_FORMATS, RENDER_FORMATS
+
+
+def neighbourhood(
+    architecture: ArchitectureConfig, focus: list[str], depth: int
+) -> set[str]:
+    """
+    Returns the names of the components that are at most `depth` references away from the focused components,
+    following references in both directions
+    """
+    unknown: list[str] = [x for x in focus if x not in architecture.index]
+    if len(unknown) >= 1:
+        raise UsageError(f"Unknown components {unknown}")
+
+    neighbours: dict[str, set[str]] = {}
+    for name in architecture.graph:
+        for target in architecture.references(name):
+            neighbours.setdefault(name, set()).add(target)
+            neighbours.setdefault(target, set()).add(name)
+
+    selected: set[str] = set(focus)
+    frontier: set[str] = set(focus)
+    for _ in range(depth):
+        frontier = {x for name in frontier for x in neighbours.get(name, ())} - selected
+        selected |= frontier
+    return selected
+
+
+def graph_nodes(
+    architecture: ArchitectureConfig, names: Optional[set[str]] = None
+) -> list[dict]:
+    """
+    Returns the components in the graph, all if `names` is None
+    """
+    return [
+        component
+        for name, component in architecture.index.items()
+        if names is None or name in names
+    ]
 
 
-def plot(input_file: str, out_file: str, out_format: str) -> None:
+def graph_edges(
+    architecture: ArchitectureConfig, names: Optional[set[str]] = None
+) -> Iterator[tuple[str, str, str]]:
+    """
+    Yields the references between the components in the graph as (component, field, referenced component)
+    """
+    for name, refs in architecture.graph.items():
+        if names is not None and name not in names:
+            continue
+        for field, target in refs:
+            if names is None or target in names:
+                yield name, field, target
+
+
+def quote(value: str) -> str:
+    """
+    Quotes an identifier or label for DOT
+    """
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def write_dot(
+    file: TextIO,
+    architecture: ArchitectureConfig,
+    names: Optional[set[str]] = None,
+    cluster: bool = False,
+) -> None:
+    """
+    Writes the graph in the DOT language, one line per component and reference
+
+    With `cluster`, the components of each type are grouped into a cluster.
+    """
+    name = (architecture.metadata or {}).get("name", "architecture")
+    file.write(f"digraph {quote(name)} {{\n")
+    file.write("  node [shape=box];\n")
+
+    nodes = graph_nodes(architecture, names)
+    groups: dict[str, list[dict]] = {"": nodes}
+    if cluster:
+        groups = {}
+        for component in nodes:
+            groups.setdefault(component["type"], []).append(component)
+
+    for index, (component_type, components) in enumerate(groups.items()):
+        indent = "  "
+        if cluster:
+            file.write(f"  subgraph cluster_{index} {{\n")
+            file.write(f"    label={quote(component_type)};\n")
+            indent = "    "
+        for component in components:
+            label = f"{component['name']}: {component['type']}"
+            file.write(f"{indent}{quote(component['name'])} [label={quote(label)}];\n")
+        if cluster:
+            file.write("  }\n")
+
+    for source, field, target in graph_edges(architecture, names):
+        file.write(f"  {quote(source)} -> {quote(target)} [label={quote(field)}];\n")
+    file.write("}\n")
+
+
+def write_json(
+    file: TextIO, architecture: ArchitectureConfig, names: Optional[set[str]] = None
+) -> None:
+    """
+    Writes the graph as JSON with a list of nodes and a list of edges, one line per component and reference
+    """
+    file.write('{"nodes": [')
+    for index, component in enumerate(graph_nodes(architecture, names)):
+        node = {"id": component["name"], "type": component["type"]}
+        file.write(("," if index else "") + "\n  " + json.dumps(node))
+    file.write('\n], "edges": [')
+    for index, (source, field, target) in enumerate(graph_edges(architecture, names)):
+        edge = {"source": source, "target": target, "field": field}
+        file.write(("," if index else "") + "\n  " + json.dumps(edge))
+    file.write("\n]}\n")
+
+
+def output_paths(output: str, formats: list[str]) -> dict[str, str]:
+    """
+    Returns the file of every format: the output itself for a single format, otherwise
+    the output with the extension of each format
+
+    An extension of another format is replaced, e.g. `-f png` with the default `out.dot` writes `out.png`.
+    """
+    stem, extension = os.path.splitext(output)
+    known = extension[1:] in GRAPH_FORMATS + RENDER_FORMATS
+    if len(formats) == 1 and extension and (extension[1:] == formats[0] or not known):
+        return {formats[0]: output}
+    if not known:
+        stem = output
+    return {x: f"{stem}.{x}" for x in formats}
+
+
+def render(dot_file: str, outputs: dict[str, str], layout: str) -> None:
+    """
+    Renders the DOT graph into all given formats with the Graphviz command line, which lays out the graph only once
+    """
+    program = shutil.which("dot")
+    if program is None:
+        raise UsageError(
+            f"Rendering {', '.join(outputs)} needs Graphviz, install it or use the formats {GRAPH_FORMATS}"
+        )
+
+    command: list[str] = [program, f"-K{layout}"]
+    for output_format, path in outputs.items():
+        command += [f"-T{output_format}", f"-o{path}"]
+    logger.info(f"Laying out the graph with {layout}...")
+    process = subprocess.run(
+        command + [dot_file], capture_output=True, text=True, check=False
+    )
+    if process.returncode != 0:
+        raise UsageError(f"Graphviz failed: {process.stderr.strip()}")
+
+
+def write_graph(
+    architecture: ArchitectureConfig,
+    names: Optional[set[str]],
+    cluster: bool,
+    dot_file: Optional[str],
+    rendered: dict[str, str],
+    layout: str,
+) -> None:
+    """
+    Writes the DOT graph and renders it, using a temporary DOT file if `dot_file` is None
+    """
+    temporary = dot_file is None
+    if temporary:
+        descriptor, dot_file = tempfile.mkstemp(suffix=".dot")
+        os.close(descriptor)
+    try:
+        with open(dot_file, "w", encoding="utf8") as file:
+            write_dot(file, architecture, names, cluster)
+        if rendered:
+            render(dot_file, rendered, layout)
+    finally:
+        if temporary:
+            os.remove(dot_file)
+
+
+def plot(
+    input_file: str,
+    out_file: str,
+    out_formats: Optional[list[str]] = None,
+    architecture_cache: Optional[str] = None,
+    layout: str = "dot",
+    cluster: bool = False,
+    focus: Optional[list[str]] = None,
+    depth: int = 1,
+) -> None:
     """
     Generates the graph
+
+    Without formats, the format is detected from the extension of `out_file`. DOT and JSON are written
+    directly, all other formats are rendered from the DOT graph by Graphviz.
     """
+    if not out_formats:
+        extension = os.path.splitext(out_file)[1][1:]
+        out_formats = [
+            extension if extension in GRAPH_FORMATS + RENDER_FORMATS else "dot"
+        ]
+    outputs = output_paths(out_file, list(dict.fromkeys(out_formats)))
 
     architecture: ArchitectureConfig
-    _, _, architecture = init(input_file)
+    _, _, architecture = init(input_file, architecture_cache=architecture_cache)
 
-    logger.info("Building graph...")
-    graph = pgv.AGraph(directed=True)
+    names: Optional[set[str]] = None
+    if focus:
+        names = neighbourhood(architecture, focus, depth)
+        logger.info(
+            f"Selected {len(names)} components within {depth} references of {focus}"
+        )
 
-    for component in architecture.components():
-        cname = component["name"]
-        ctype = component["type"]
-        graph.add_node(cname, label=f"{cname}: {ctype}", shape="box")
+    for folder in {os.path.dirname(x) for x in outputs.values()} - {""}:
+        os.makedirs(folder, exist_ok=True)
 
-        if "properties" in component and isinstance(component["properties"], dict):
-            cproperties = component["properties"]
-            for name, tag in utils.get_type_occurences(cproperties, RefTag):
-                graph.add_edge(cname, tag.value, label=name)
+    logger.info("Writing graph...")
+    if "json" in outputs:
+        with open(outputs["json"], "w", encoding="utf8") as file:
+            write_json(file, architecture, names)
 
-    logger.info("Finished graph")
-    print(graph)
+    rendered: dict[str, str] = {
+        x: path for x, path in outputs.items() if x in RENDER_FORMATS
+    }
+    if "dot" in outputs or rendered:
+        write_graph(architecture, names, cluster, outputs.get("dot"), rendered, layout)
 
-    logger.info("Saving output...")
-    graph.draw(out_file, prog=out_format)
+    logger.success(f"Saved {', '.join(outputs.values())}")
@@ -0,0 +1,222 @@
+"""
+Contains the loading of architecture files, which can include the platforms and components of other files with `!include`
+"""
+
+import glob
+import os
+from typing import Optional
+
+import yaml
+from loguru import logger
+
+from . import utils
+from .cache import ArchitectureCache
+from .errors import ConfigError
+from .schema import Schema
+from .tags import IncludeTag, architecture_loader
+from .validator import ArchitectureValidator
+
+# the lists of the architecture spec that can include other files
+INCLUDE_FIELDS: list[str] = ["platforms", "components"]
+
+
+def read_file(path: str) -> bytes:
+    """
+    Reads a file, raising a ConfigError if it does not exist
+    """
+    try:
+        with open(path, "rb") as file:
+            return file.read()
+    except FileNotFoundError as err:
+        raise ConfigError(f"'{path}' not found", path) from err
+
+
+def parse_file(path: str, contents: bytes) -> any:
+    """
+    Parses the contents of an architecture file
+    """
+    try:
+        return yaml.load(contents, Loader=architecture_loader())
+    except yaml.YAMLError as err:
+        raise ConfigError(f"Error parsing '{path}': {err}", path) from err
+
+
+def entries(value: any) -> list:
+    """
+    Returns the entries of a platform or component list, which can also be a single include
+    """
+    if isinstance(value, IncludeTag):
+        return [value]
+    return value if isinstance(value, list) else []
+
+
+def without_includes(data: any) -> any:
+    """
+    Returns the data of an architecture file with the includes removed, so it can be validated on its own
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("spec"), dict):
+        return data
+    spec: dict = dict(data["spec"])
+    for field in INCLUDE_FIELDS:
+        if field in spec and (
+            isinstance(spec[field], IncludeTag)
+            or any(isinstance(x, IncludeTag) for x in entries(spec[field]))
+        ):
+            spec[field] = [
+                x for x in entries(spec[field]) if not isinstance(x, IncludeTag)
+            ]
+    return data | {"spec": spec}
+
+
+def include_paths(tag: IncludeTag, folder: str) -> list[str]:
+    """
+    Returns the files an include refers to, relative to the folder of the including file and in sorted order for glob patterns
+    """
+    pattern = os.path.join(folder, tag.value)
+    if not any(x in tag.value for x in "*?["):
+        return [pattern]
+
+    paths: list[str] = sorted(glob.glob(pattern, recursive=True))
+    if len(paths) == 0:
+        raise ConfigError(f"'{tag.value}' does not match any files", pattern)
+    return paths
+
+
+def load_included_file(
+    path: str, field: str, rules: dict, cache: Optional[ArchitectureCache] = None
+) -> list[dict]:
+    """
+    Parses and validates the list of platforms or components in an included file
+    """
+    contents = read_file(path)
+    key = ArchitectureCache.key(contents, [field, rules])
+    if cache is not None:
+        cached: Optional[list[dict]] = cache.get(key)
+        if cached is not None:
+            return cached
+
+    data = parse_file(path, contents)
+    if not isinstance(data, list):
+        raise ConfigError(
+            f"Error parsing '{path}': included files must contain a list of {field}",
+            path,
+        )
+    if any(isinstance(x, IncludeTag) for x in data):
+        raise ConfigError(
+            f"Error parsing '{path}': included files cannot include other files", path
+        )
+
+    success, errors = utils.validate(
+        {field: data}, None, ArchitectureValidator({field: rules})
+    )
+    if not success:
+        raise ConfigError(f"Error parsing '{path}': {errors}", path)
+
+    if cache is not None:
+        cache.set(key, data)
+    return data
+
+
+def load_included_files(
+    files: list[tuple[str, str]],
+    rules: dict[str, dict],
+    cache: Optional[ArchitectureCache] = None,
+    workers: int = 1,
+) -> list[list[dict]]:
+    """
+    Loads the included files, given as (path, field), in parallel if there are several workers
+    """
+    results: list[Optional[list[dict]]] = [None] * len(files)
+    if cache is not None:
+        # cached files are faster to load here than to send through the pool
+        for index, (path, field) in enumerate(files):
+            key = ArchitectureCache.key(read_file(path), [field, rules[field]])
+            results[index] = cache.get(key)
+    pending: list[int] = [i for i, x in enumerate(results) if x is None]
+
+    if workers <= 1 or len(pending) <= 1:
+        for index in pending:
+            path, field = files[index]
+            results[index] = load_included_file(path, field, rules[field], cache)
+        return results
+
+    # multiprocessing is slow to import and only needed for parallel runs
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = min(workers, len(pending))
+    logger.info(f"Parsing {len(pending)} included files with {workers} workers...")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        loaded = executor.map(
+            load_included_file,
+            [files[i][0] for i in pending],
+            [files[i][1] for i in pending],
+            [rules[files[i][1]] for i in pending],
+            [cache] * len(pending),
+            chunksize=max(1, len(pending) // (workers * 4)),
+        )
+        for index, data in zip(pending, loaded):
+            results[index] = data
+    return results
+
+
+def load_architecture_file(
+    path: str,
+    schema: Schema,
+    cache: Optional[ArchitectureCache] = None,
+    workers: int = 1,
+) -> tuple[dict, list[str]]:
+    """
+    Parses and validates an architecture file and the files it includes, returning the data and the paths of all files
+
+    Every file is validated on its own, and with a `cache` the result of every file is reused while it does
+    not change. Includes are replaced by the entries of the included files, in the order of the includes.
+    """
+    contents = read_file(path)
+    key = ArchitectureCache.key(contents, [None, schema.spec])
+    data: Optional[dict] = cache.get(key) if cache is not None else None
+    if data is None:
+        data = parse_file(path, contents)
+        success, errors = utils.validate(
+            without_includes(data), None, schema.validator(ArchitectureValidator)
+        )
+        if not success:
+            raise ConfigError(f"Error parsing '{path}': {errors}", path)
+        if cache is not None:
+            cache.set(key, data)
+
+    # includes are replaced by the paths of the files they refer to
+    folder = os.path.dirname(path)
+    plan: dict[str, list] = {
+        field: [
+            include_paths(x, folder) if isinstance(x, IncludeTag) else x
+            for x in entries(data["spec"].get(field))
+        ]
+        for field in INCLUDE_FIELDS
+    }
+    files: list[tuple[str, str]] = [
+        (x, field)
+        for field, items in plan.items()
+        for item in items
+        if isinstance(item, list)
+        for x in item
+    ]
+    if len(files) == 0:
+        return data, [path]
+
+    rules: dict[str, dict] = {
+        field: schema.spec["spec"]["schema"][field] for field in INCLUDE_FIELDS
+    }
+    included = iter(load_included_files(files, rules, cache, workers))
+
+    spec: dict = dict(data["spec"])
+    for field, items in plan.items():
+        spec[field] = []
+        for item in items:
+            if isinstance(item, list):
+                for _ in item:
+                    spec[field].extend(next(included))
+            else:
+                spec[field].append(item)
+
+    logger.debug(f"Included {len(files)} files into {path}")
+    return data | {"spec": spec}, [path] + [x for x, _ in files]
@@ -7,8 +7,8 @@ import sys
 
 from loguru import logger
 
-from .graph import plot
-from .transpiler import transpile
+from .errors import MultiformError, UsageError, log_error
+from .plot_options import GRAPH_FORMATS, LAYOUTS, RENDER_FORMATS
 
 
 def main() -> None:
@@ -19,13 +19,121 @@ def main() -> None:
 
     setup_logging(args.verbosity)
 
+    try:
+        run(args)
+    except MultiformError as err:
+        log_error(err)
+        sys.exit(1)
+
+
+def run(args: argparse.Namespace) -> None:
+    """
+    Runs the selected subcommand
+    """
+    # subcommands are imported on demand, so that e.g. the cli never loads the templating engine
     if args.command == "transpile":
+        from .cache import default_render_cache
+        from .session import Multiform, TranspileOptions
+
+        if args.diff and not args.plan:
+            raise UsageError("--diff can only be used with --plan")
+        if args.plan and (len(args.architecture) > 1 or args.overlays or args.trace):
+            raise UsageError(
+                "--plan can only be used with a single architecture without overlays or --trace"
+            )
+
         # todo: verify valid dirs
-        transpile(
-            args.architecture, args.templates, args.output, args.report, args.debug
+        logger.info("Initializing...")
+        session = Multiform(args.templates, args.template_cache)
+        options = TranspileOptions(
+            args.report,
+            args.debug,
+            args.template_cache,
+            args.jobs,
+            args.only,
+            args.types,
+            args.platforms,
+            args.slowest,
+            args.architecture_cache,
+            args.report_file,
+            args.report_format,
+            args.output_format,
+            args.fsync,
+            (default_render_cache() if args.render_cache == "" else args.render_cache),
+            args.render_cache_size,
+            args.plan,
+            args.diff,
         )
+        if not args.plan:
+            session.transpile(
+                args.architecture, args.output, options, args.trace, args.overlays
+            )
+            return
+
+        from .sink import format_plan
+
+        plan = session.plan(args.architecture[0], args.output, options)
+        print(format_plan(plan), end="")
+        # like `terraform plan -detailed-exitcode`, errors exit with 1 and changes with 2
+        if plan:
+            sys.exit(2)
+    elif args.command == "watch":
+        from .watch import watch
+
+        watch(
+            args.architecture,
+            args.templates,
+            args.output,
+            args.template_cache,
+            args.jobs,
+            args.poll,
+            args.interval,
+        )
+    elif args.command == "serve":
+        from .serve import serve
+
+        serve(
+            args.templates,
+            args.host,
+            args.port,
+            args.template_cache,
+            args.jobs,
+            args.poll,
+            args.interval,
+        )
+    elif args.command == "compile-templates":
+        from .transpiler import compile_templates
+
+        compile_templates(args.templates, args.output)
+    elif args.command == "check-templates":
+        from .check import check_templates
+
+        check_templates(args.templates, args.architecture)
     elif args.command == "plot":
-        plot(args.architecture, args.output, args.format)
+        from .graph import plot
+
+        plot(
+            args.architecture,
+            args.output,
+            args.formats,
+            args.architecture_cache,
+            args.layout,
+            args.cluster,
+            args.focus,
+            args.depth,
+        )
+    elif args.command == "cache":
+        from .cache import RENDER_CACHE_SIZE, manage_render_cache
+
+        manage_render_cache(
+            args.action,
+            args.render_cache,
+            (
+                RENDER_CACHE_SIZE
+                if args.render_cache_size is None
+                else args.render_cache_size
+            ),
+        )
 
 
 def parse_args() -> dict:
@@ -55,20 +163,60 @@ def parse_args() -> dict:
     transpile_parser.add_argument(
         "--architecture",
         "-a",
-        default="architecture.yaml",
+        default=["architecture.yaml"],
         dest="architecture",
+        nargs="+",
         required=True,
-        help="the architecture definition file",
+        help="the architecture definition file, or several files or folders of them, "
+        "which are written to a folder per architecture",
     )
     transpile_parser.add_argument(
-        "--output", "-o", default="out/", dest="output", help="the output directory"
+        "--overlay",
+        default=None,
+        dest="overlays",
+        nargs="+",
+        help="overlay files that patch the architecture into variants, e.g. environments, "
+        "which are written to a folder per overlay name",
+    )
+    transpile_parser.add_argument(
+        "--output",
+        "-o",
+        default="out/",
+        dest="output",
+        help="the output directory, a .tar, .tar.gz, .tgz or .zip archive, or - to stream a tar archive to stdout",
+    )
+    transpile_parser.add_argument(
+        "--output-format",
+        default=None,
+        dest="output_format",
+        choices=["directory", "tar", "tgz", "zip"],
+        help="the output format, detected from the output path by default",
+    )
+    transpile_parser.add_argument(
+        "--fsync",
+        action="store_true",
+        dest="fsync",
+        help="flush every output file to disk before it replaces the previous one",
+    )
+    transpile_parser.add_argument(
+        "--plan",
+        action="store_true",
+        dest="plan",
+        help="only print the files that would be created, updated or deleted in the output directory, "
+        "exiting with 2 if there are any",
+    )
+    transpile_parser.add_argument(
+        "--diff",
+        action="store_true",
+        dest="diff",
+        help="print a unified diff of every change with --plan",
     )
     transpile_parser.add_argument(
         "--templates",
         "-t",
         default="templates/",
         dest="templates",
-        help="the template directory",
+        help="the template directory or a compiled template bundle",
     )
     transpile_parser.add_argument(
         "--report",
@@ -84,9 +232,228 @@ def parse_args() -> dict:
         dest="debug",
         help="enable debug output and report",
     )
+    transpile_parser.add_argument(
+        "--template-cache",
+        "-c",
+        default=None,
+        dest="template_cache",
+        help="persist compiled templates in the given directory",
+    )
+    transpile_parser.add_argument(
+        "--jobs",
+        "-j",
+        default=1,
+        type=int,
+        dest="jobs",
+        help="the number of processes used to parse included files, validate, render and write the files, "
+        "or to transpile the architectures of a batch",
+    )
+    transpile_parser.add_argument(
+        "--only",
+        action="append",
+        dest="only",
+        metavar="COMPONENT",
+        help="only transpile the given component and the components it references (repeatable)",
+    )
+    transpile_parser.add_argument(
+        "--type",
+        action="append",
+        dest="types",
+        metavar="TYPE",
+        help="only transpile components of the given type and the components they reference (repeatable)",
+    )
+    transpile_parser.add_argument(
+        "--platform",
+        action="append",
+        dest="platforms",
+        metavar="PLATFORM",
+        help="only transpile for the given platform (repeatable)",
+    )
+    transpile_parser.add_argument(
+        "--trace",
+        default=None,
+        dest="trace",
+        help="write a Chrome trace event file of the transpilation",
+    )
+    transpile_parser.add_argument(
+        "--slowest",
+        default=10,
+        type=int,
+        dest="slowest",
+        help="the number of slowest templates and components in the report",
+    )
+    transpile_parser.add_argument(
+        "--report-file",
+        default=None,
+        dest="report_file",
+        help="the report file, defaults to report.<format> in the output directory",
+    )
+    transpile_parser.add_argument(
+        "--report-format",
+        default="yaml",
+        dest="report_format",
+        choices=["yaml", "jsonl"],
+        help="write the report as a YAML stream or as JSON lines",
+    )
+    transpile_parser.add_argument(
+        "--render-cache",
+        default=None,
+        const="",
+        nargs="?",
+        dest="render_cache",
+        help="reuse rendered files from the given directory (default: the user cache directory) "
+        "if their template and data did not change",
+    )
+    transpile_parser.add_argument(
+        "--render-cache-size",
+        default=None,
+        type=int,
+        dest="render_cache_size",
+        help="the size limit of the render cache in megabytes (default 512), "
+        "the least recently used renders are evicted beyond it",
+    )
+    transpile_parser.add_argument(
+        "--architecture-cache",
+        default=None,
+        dest="architecture_cache",
+        help="reuse the parsed architecture files from the given directory if they did not change",
+    )
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="transpiles the given architecture on every change"
+    )
+    watch_parser.add_argument(
+        "--architecture",
+        "-a",
+        default="architecture.yaml",
+        dest="architecture",
+        required=True,
+        help="the architecture definition file",
+    )
+    watch_parser.add_argument(
+        "--output", "-o", default="out/", dest="output", help="the output directory"
+    )
+    watch_parser.add_argument(
+        "--templates",
+        "-t",
+        default="templates/",
+        dest="templates",
+        help="the template directory",
+    )
+    watch_parser.add_argument(
+        "--template-cache",
+        "-c",
+        default=None,
+        dest="template_cache",
+        help="persist compiled templates in the given directory",
+    )
+    watch_parser.add_argument(
+        "--jobs",
+        "-j",
+        default=1,
+        type=int,
+        dest="jobs",
+        help="the number of processes used to render and write the files",
+    )
+    watch_parser.add_argument(
+        "--poll",
+        action="store_true",
+        dest="poll",
+        help="poll for changes instead of using inotify",
+    )
+    watch_parser.add_argument(
+        "--interval",
+        default=0.5,
+        type=float,
+        dest="interval",
+        help="the polling interval in seconds",
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="serves the transpiler over HTTP with warm caches"
+    )
+    serve_parser.add_argument(
+        "--templates",
+        "-t",
+        default="templates/",
+        dest="templates",
+        help="the template directory or a compiled template bundle",
+    )
+    serve_parser.add_argument(
+        "--host", default="127.0.0.1", dest="host", help="the address to listen on"
+    )
+    serve_parser.add_argument(
+        "--port", "-p", default=8080, type=int, dest="port", help="the port"
+    )
+    serve_parser.add_argument(
+        "--template-cache",
+        "-c",
+        default=None,
+        dest="template_cache",
+        help="persist compiled templates in the given directory",
+    )
+    serve_parser.add_argument(
+        "--jobs",
+        "-j",
+        default=4,
+        type=int,
+        dest="jobs",
+        help="the number of threads that handle requests",
+    )
+    serve_parser.add_argument(
+        "--poll",
+        action="store_true",
+        dest="poll",
+        help="poll for template changes instead of using inotify",
+    )
+    serve_parser.add_argument(
+        "--interval",
+        default=0.5,
+        type=float,
+        dest="interval",
+        help="the polling interval in seconds",
+    )
+
+    compile_parser = subparsers.add_parser(
+        "compile-templates",
+        help="validates and precompiles the templates into a single bundle file",
+    )
+    compile_parser.add_argument(
+        "--templates",
+        "-t",
+        default="templates/",
+        dest="templates",
+        help="the template directory",
+    )
+    compile_parser.add_argument(
+        "--output",
+        "-o",
+        default="templates.mfb",
+        dest="output",
+        help="the generated bundle",
+    )
+
+    check_parser = subparsers.add_parser(
+        "check-templates",
+        help="checks that the templates only use declared variables, without rendering them",
+    )
+    check_parser.add_argument(
+        "--templates",
+        "-t",
+        default="templates/",
+        dest="templates",
+        help="the template directory or bundle",
+    )
+    check_parser.add_argument(
+        "--architecture",
+        "-a",
+        default=None,
+        dest="architecture",
+        help="an architecture definition file that provides the metadata and platform properties",
+    )
 
     plot_parser = subparsers.add_parser(
-        "plot", help="generates a graphviz .dot file of the architecture"
+        "plot", help="generates a DOT or JSON graph of the architecture"
     )
     plot_parser.add_argument(
         "--architecture",
@@ -97,34 +464,76 @@ def parse_args() -> dict:
         help="the architecture definition file",
     )
     plot_parser.add_argument(
-        "--output", "-o", default="out.dot", dest="output", help="the generated file"
+        "--output",
+        "-o",
+        default="out.dot",
+        dest="output",
+        help="the generated file, which gets the extension of each format if there are several",
     )
     plot_parser.add_argument(
         "--format",
         "-f",
+        default=None,
+        dest="formats",
+        nargs="+",
+        choices=GRAPH_FORMATS + RENDER_FORMATS,
+        help="the file formats of the output, detected from the output file by default; "
+        "all but dot and json are rendered by Graphviz",
+    )
+    plot_parser.add_argument(
+        "--layout",
         default="dot",
-        dest="format",
-        nargs="?",
-        choices=[
-            "neato",
-            "dot",
-            "twopi",
-            "circo",
-            "fdp",
-            "nop",
-            "osage",
-            "patchwork",
-            "gc",
-            "acyclic",
-            "gvpr",
-            "gvcolor",
-            "ccomps",
-            "sccmap",
-            "tred",
-            "sfdp",
-            "unflatten",
-        ],
-        help="the file format of the output",
+        dest="layout",
+        choices=LAYOUTS,
+        help="the Graphviz layout engine used to render the graph",
+    )
+    plot_parser.add_argument(
+        "--cluster",
+        action="store_true",
+        dest="cluster",
+        help="group the components of each type into a cluster",
+    )
+    plot_parser.add_argument(
+        "--focus",
+        action="append",
+        dest="focus",
+        metavar="COMPONENT",
+        help="only plot the components around the given component (repeatable)",
+    )
+    plot_parser.add_argument(
+        "--depth",
+        default=1,
+        type=int,
+        dest="depth",
+        help="the number of references to follow from the focused components",
+    )
+    plot_parser.add_argument(
+        "--architecture-cache",
+        default=None,
+        dest="architecture_cache",
+        help="reuse the parsed architecture files from the given directory if they did not change",
+    )
+
+    cache_parser = subparsers.add_parser(
+        "cache", help="reports the stats of the render cache, prunes or clears it"
+    )
+    cache_parser.add_argument(
+        "action",
+        choices=["stats", "prune", "clear"],
+        help="the action to perform",
+    )
+    cache_parser.add_argument(
+        "--render-cache",
+        default=None,
+        dest="render_cache",
+        help="the render cache directory, defaults to the one in the user cache directory",
+    )
+    cache_parser.add_argument(
+        "--render-cache-size",
+        default=None,
+        type=int,
+        dest="render_cache_size",
+        help="the size limit of the render cache in megabytes (default 512)",
     )
 
     return parser.parse_args()
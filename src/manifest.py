@@ -0,0 +1,206 @@
+"""
+Contains the manifest that keeps track of the generated files in an output directory
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from typing import Optional
+
+from loguru import logger
+
+from .writer import TEMP_PREFIX, AtomicWriter, write_file
+
+MANIFEST_FILE: str = ".multiform-manifest.json"
+
+# files that are created by terraform and must never be touched
+PROTECTED_FILES: list[str] = [
+    ".terraform.lock.hcl",
+    "terraform.tfstate",
+    ".terraform.tfstate.lock.info",
+    "terraform.tfstate.backup",
+]
+
+CREATED: str = "created"
+UPDATED: str = "updated"
+UNCHANGED: str = "unchanged"
+DELETED: str = "deleted"
+
+
+class Manifest:
+    """
+    The content hashes of the files that were generated into an output directory
+    """
+
+    def __init__(self, folder: str, previous: dict[str, dict]) -> None:
+        self.folder = folder
+        self.previous = previous
+        self.files: dict[str, dict] = {}
+        self.changes: Counter = Counter()
+
+    def sync(
+        self, name: str, component: str, contents: str, writer: AtomicWriter
+    ) -> tuple[str, dict]:
+        """
+        Writes the file `name` of `component` with the writer unless it already has the given contents,
+        returning the status and the new entry
+
+        Only the previous state is read, so this can be called from worker processes with a copy of the manifest.
+        The modification time is set when writing, so the entry is known before the writer finishes.
+        """
+        data = contents.encode("utf8")
+        digest = hashlib.sha256(data).hexdigest()
+        entry = self.check(name, component, data, digest)
+        if entry is not None:
+            return UNCHANGED, entry
+
+        path = os.path.join(self.folder, name)
+        # files that were deleted from the output directory are created again
+        status = UPDATED if name in self.previous and os.path.isfile(path) else CREATED
+        mtime = time.time_ns()
+        writer.write(path, data, mtime)
+
+        return status, Manifest.entry(digest, len(data), mtime, component)
+
+    def check(
+        self, name: str, component: str, data: bytes, digest: str
+    ) -> Optional[dict]:
+        """
+        Returns the entry of the file `name` if it already has the given contents, or None if it has to be written
+
+        Files are only hashed if their size and modification time do not match the manifest anymore.
+        """
+        entry: Optional[dict] = self.previous.get(name)
+        if entry is None:
+            return None
+
+        path = os.path.join(self.folder, name)
+        stat = Manifest.stat(path)
+        if stat is None:
+            return None
+
+        current = Manifest.entry(digest, stat.st_size, stat.st_mtime_ns, component)
+        # size and mtime still match the manifest, so its hash can be trusted
+        if current == entry:
+            return entry
+        # the file is unknown or was touched since the last run
+        if stat.st_size == len(data) and Manifest.digest(path) == digest:
+            return current
+        return None
+
+    def record(self, name: str, status: str, entry: dict) -> None:
+        """
+        Records the result of `sync`
+        """
+        self.files[name] = entry
+        self.changes[status] += 1
+
+    def prune(self, keep: Optional[set[str]] = None, delete: bool = True) -> list[str]:
+        """
+        Deletes the previously generated files that were not generated again, returning their paths
+
+        Files of the components in `keep` (and files of unknown components) are kept and stay in
+        the manifest, which is used when only a subset of the components was rendered. Without
+        `delete`, only the paths of the files that would be deleted are returned.
+        """
+        deleted: list[str] = []
+        for name, entry in self.previous.items():
+            if name in self.files:
+                continue
+            if keep is not None and entry.get("component", None) in keep | {None}:
+                self.files[name] = entry
+                continue
+            path = os.path.join(self.folder, name)
+            # files that are already gone are only removed from the manifest
+            if os.path.isfile(path):
+                if delete:
+                    os.remove(path)
+                deleted.append(path)
+                self.changes[DELETED] += 1
+        return deleted
+
+    def save(self, fsync: bool = False) -> None:
+        """
+        Writes the manifest to the output directory if it changed
+        """
+        if self.files == self.previous and os.path.isfile(
+            os.path.join(self.folder, MANIFEST_FILE)
+        ):
+            return
+
+        write_file(
+            os.path.join(self.folder, MANIFEST_FILE),
+            json.dumps(self.files, indent=2, sort_keys=True).encode("utf8"),
+            fsync=fsync,
+        )
+
+    def summary(self) -> dict[str, int]:
+        """
+        Returns the number of created, updated, unchanged and deleted files
+        """
+        return {
+            status: self.changes[status]
+            for status in [CREATED, UPDATED, UNCHANGED, DELETED]
+        }
+
+    @staticmethod
+    def entry(digest: str, size: int, mtime: int, component: str) -> dict:
+        """
+        Creates a manifest entry for a file, with its modification time in nanoseconds
+        """
+        return {
+            "sha256": digest,
+            "size": size,
+            "mtime": mtime,
+            "component": component,
+        }
+
+    @staticmethod
+    def stat(path: str) -> Optional[os.stat_result]:
+        """
+        Returns the stat of a file or None if it does not exist
+        """
+        try:
+            return os.stat(path)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def digest(path: str) -> str:
+        """
+        Returns the content hash of a file
+        """
+        with open(path, "rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()
+
+    @staticmethod
+    def load(folder: str) -> Manifest:
+        """
+        Loads the manifest of an output directory
+
+        Directories without a manifest were written by older versions, so all files except
+        the terraform state are treated as generated files with unknown contents.
+        """
+        path = os.path.join(folder, MANIFEST_FILE)
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf8") as file:
+                    return Manifest(folder, json.load(file))
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring invalid manifest '{path}'")
+
+        previous: dict[str, dict] = {}
+        if os.path.isdir(folder):
+            for name in os.listdir(folder):
+                if (
+                    os.path.isfile(os.path.join(folder, name))
+                    and name not in PROTECTED_FILES
+                    and name != MANIFEST_FILE
+                    and not name.startswith(TEMP_PREFIX)
+                ):
+                    previous[name] = {}
+        return Manifest(folder, previous)
@@ -0,0 +1,108 @@
+"""
+Contains the overlay class, which patches an architecture into a variant such as an environment
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from . import utils
+from .architecture import ArchitectureConfig
+from .config import YamlConfig
+from .errors import ArchitectureError
+from .tags import architecture_loader
+from .validator import ArchitectureValidator
+
+
+def merge(base: dict, patch: dict) -> dict:
+    """
+    Merges `patch` into a copy of `base`, merging nested dicts and replacing all other values
+    """
+    merged = dict(base)
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class OverlayConfig(YamlConfig):
+    """
+    The overlay class parsed from YAML
+
+    An overlay overrides the metadata, the properties of platforms and the properties of components
+    of an architecture, addressing platforms and components by name. Its name is the name of the variant.
+    """
+
+    SCHEMA_NAME: str = "Overlay"
+
+    def __init__(self, metadata: dict, spec: dict) -> None:
+        super().__init__(metadata, spec)
+        self.name: str = metadata["name"]
+
+    def apply(self, architecture: ArchitectureConfig) -> ArchitectureConfig:
+        """
+        Returns the variant of the architecture with the overlay applied
+
+        Platforms and components that are not patched are shared with the architecture, so
+        they are only validated once for all variants.
+        """
+        platforms: dict[str, dict] = {
+            x["name"]: x["properties"] for x in self.spec.get("platforms") or []
+        }
+        components: dict[str, dict] = {
+            x["name"]: x["properties"] for x in self.spec.get("components") or []
+        }
+
+        unknown: list[str] = [
+            f"Overlay '{self.name}' patches unknown platform '{x}'"
+            for x in platforms
+            if x not in [y["name"] for y in architecture.platforms()]
+        ] + [
+            f"Overlay '{self.name}' patches unknown component '{x}'"
+            for x in components
+            if x not in architecture.index
+        ]
+        if len(unknown) >= 1:
+            raise ArchitectureError(
+                f"Cannot apply overlay '{self.name}' to the architecture", unknown
+            )
+
+        return ArchitectureConfig(
+            merge(architecture.metadata or {}, self.spec.get("metadata") or {}),
+            architecture.spec
+            | {
+                "platforms": [
+                    OverlayConfig.patch(x, platforms.get(x["name"]))
+                    for x in architecture.platforms()
+                ],
+                "components": [
+                    OverlayConfig.patch(x, components.get(x["name"]))
+                    for x in architecture.components()
+                ],
+            },
+        )
+
+    @staticmethod
+    def patch(entry: dict, properties: Optional[dict]) -> dict:
+        """
+        Returns a platform or component with the given properties merged into its properties
+        """
+        if properties is None:
+            return entry
+        return entry | {"properties": merge(entry.get("properties") or {}, properties)}
+
+    @staticmethod
+    def with_schema_registry(
+        path: str, schema_registry: dict[str, dict]
+    ) -> OverlayConfig:
+        """
+        Parses the overlay file from a path
+        """
+        schema: dict = schema_registry[OverlayConfig.SCHEMA_NAME]
+        data: dict = utils.load_yaml_and_validate_handle_errors(
+            path, None, architecture_loader(), schema.validator(ArchitectureValidator)
+        )
+
+        return OverlayConfig(data["metadata"], data["spec"])
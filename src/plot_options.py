@@ -0,0 +1,19 @@
+"""
+Contains the formats and layouts of the plot command, which the CLI uses without loading the graph module
+"""
+
+# formats that are written without Graphviz
+GRAPH_FORMATS: list[str] = ["dot", "json"]
+# formats that Graphviz renders from the DOT graph in a single layout pass
+RENDER_FORMATS: list[str] = ["svg", "png", "jpg", "gif", "pdf", "ps"]
+# the Graphviz layout engines
+LAYOUTS: list[str] = [
+    "dot",
+    "neato",
+    "twopi",
+    "circo",
+    "fdp",
+    "sfdp",
+    "osage",
+    "patchwork",
+]
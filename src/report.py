@@ -0,0 +1,138 @@
+"""
+Contains the report writer, which streams the report to disk while the outputs are generated
+"""
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import os
+from typing import Optional, TextIO
+
+import yaml
+from loguru import logger
+
+from .tags import RefTag, report_dumper
+
+REPORT_FORMATS: list[str] = ["yaml", "jsonl"]
+REPORT_EXTENSIONS: dict[str, str] = {"yaml": ".yaml", "jsonl": ".jsonl"}
+
+
+def encode_json(value: any) -> any:
+    """
+    Encodes references as JSON, raising a TypeError for any other value JSON does not support
+
+    Render cache keys rely on the TypeError to skip data that cannot be hashed reliably.
+    """
+    if isinstance(value, RefTag):
+        return {"!ref": value.value}
+    raise TypeError(f"Cannot encode {type(value).__name__} as JSON")
+
+
+def encode_report(value: any) -> any:
+    """
+    Encodes the values JSON does not support for the report, e.g. the dates YAML parses
+    """
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    try:
+        return encode_json(value)
+    except TypeError:
+        return str(value)
+
+
+class ReportWriter:
+    """
+    Writes the report as a stream of records, one YAML document or JSON line each
+
+    The stream starts with a `metadata` record, followed by a `mapping` record for every
+    generated file and ends with a `stats` record. In debug mode, every distinct properties
+    payload is written once as a `properties` record, which the mappings reference by id.
+    """
+
+    def __init__(self, path: str, report_format: str, debug: bool) -> None:
+        self.path = path
+        self.report_format = report_format
+        self.debug = debug
+        # digest of the canonical properties -> id of the properties record
+        self.properties: dict[bytes, int] = {}
+        self.file: Optional[TextIO] = None
+
+    @staticmethod
+    def default_path(out_dir: str, report_format: str) -> str:
+        """
+        Returns the report path that is used if none is given
+        """
+        return os.path.join(out_dir, f"report{REPORT_EXTENSIONS[report_format]}")
+
+    def __enter__(self) -> ReportWriter:
+        logger.info(f"Streaming report to {self.path}...")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.file = open(self.path, "w", encoding="utf8")
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.file.close()
+
+    def write(self, record: dict) -> None:
+        """
+        Appends a record to the report
+        """
+        if self.report_format == "jsonl":
+            self.file.write(json.dumps(record, default=encode_report) + "\n")
+        else:
+            yaml.dump(
+                record,
+                self.file,
+                Dumper=report_dumper(),
+                explicit_start=True,
+                sort_keys=False,
+            )
+
+    def metadata(self, metadata: Optional[dict], platforms: list[str]) -> None:
+        """
+        Writes the record that describes the architecture
+        """
+        self.write({"kind": "metadata", "metadata": metadata, "platforms": platforms})
+
+    def properties_id(self, properties: dict) -> int:
+        """
+        Returns the id of a properties payload, writing its record the first time it is seen
+        """
+        canonical = json.dumps(properties, sort_keys=True, default=encode_report)
+        digest = hashlib.sha256(canonical.encode("utf8")).digest()
+        if digest not in self.properties:
+            self.properties[digest] = len(self.properties)
+            self.write(
+                {
+                    "kind": "properties",
+                    "id": self.properties[digest],
+                    "properties": properties,
+                }
+            )
+        return self.properties[digest]
+
+    def mapping(
+        self, platform: str, component: str, path: str, properties: dict
+    ) -> None:
+        """
+        Writes the record of a generated file
+        """
+        record = {
+            "kind": "mapping",
+            "platform": platform,
+            "component": component,
+            "path": path,
+        }
+        if self.debug:
+            record["properties"] = self.properties_id(properties)
+        self.write(record)
+
+    def stats(self, stats: dict) -> None:
+        """
+        Writes the closing record with the stats of the transpilation
+        """
+        self.write({"kind": "stats", "stats": stats})
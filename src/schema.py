@@ -4,27 +4,54 @@ Contains the Schema class
 
 from __future__ import annotations
 
+import hashlib
 import os
-from typing import Callable, NewType
-
+import pickle
+import threading
+from functools import partial
+from importlib import resources
+from importlib.abc import Traversable
+from typing import Callable, NewType, Optional, Type
+
+import cerberus
+import yaml
 from loguru import logger
 
-from . import utils
+from . import __version__, utils
+from .cache import user_cache_dir
 from .config import YamlConfig
+from .errors import SchemaError
 
 SchemaRegistry = NewType("SchemaRegistry", dict[str, "Schema"])
 
 
+def check_kind(kind: str, field: str, value: str, error: Callable) -> None:
+    """
+    Checks if a schema is of the given kind
+    """
+    if not value == kind:
+        error(field, f"must be '{kind}'")
+
+
 class Schema(YamlConfig):
     """
     Represents a schema in memory
     """
 
-    DEFAULT_SCHEMA_PATH: str = "src/schemas"
+    # the schemas that are shipped as package data
+    SCHEMA_RESOURCES: Traversable = resources.files(__package__).joinpath("schemas")
 
     def __init__(self, metadata: dict, spec: dict) -> None:
         super().__init__(metadata, spec)
         self.name = metadata["name"]
+        # validators keep the state of the running validation, so every thread gets its own
+        self.validators: dict[
+            tuple[Type[cerberus.Validator], int], cerberus.Validator
+        ] = {}
+
+    def __getstate__(self) -> dict:
+        # validators are rebuilt on demand
+        return self.__dict__ | {"validators": {}}
 
     def validate(self, data: dict) -> dict:
         """
@@ -32,17 +59,28 @@ class Schema(YamlConfig):
         """
         utils.load_yaml_and_validate_handle_errors(data, self.spec)
 
+    def validator(
+        self, validator_class: Type[cerberus.Validator] = cerberus.Validator
+    ) -> cerberus.Validator:
+        """
+        Returns a validator for this schema, which is only built once per validator class and thread
+        """
+        key = (validator_class, threading.get_ident())
+        if key not in self.validators:
+            try:
+                self.validators[key] = validator_class(self.spec)
+            except cerberus.schema.SchemaError as err:
+                raise SchemaError(f"Error parsing schema {self.name}: {err}") from err
+        return self.validators[key]
+
     @staticmethod
     def __kind_check_fn(kind: str) -> Callable[[str, str, dict], dict]:
         """
         Returns a utility function that checks if a schema is of the given kind
-        """
 
-        def is_kind(field, value, error):
-            if not value == kind:
-                error(field, f"must be '{kind}'")
-
-        return is_kind
+        The function is a partial of a module level function, so that schemas can be pickled.
+        """
+        return partial(check_kind, kind)
 
     @staticmethod
     def __master_schema() -> dict:
@@ -76,13 +114,17 @@ class Schema(YamlConfig):
         """
         Loads a schema file from path and returns the data as a dict.
         """
-        schema = utils.load_yaml(path)
+        return Schema.parse(utils.load_yaml(path), path)
 
+    @staticmethod
+    def parse(schema: dict, path: str) -> Schema:
+        """
+        Validates the data of a schema file and creates the Schema
+        """
         # validate against master schema
         success, errors = utils.validate(schema, Schema.__master_schema())
         if not success:
-            logger.error(f"Wrong yaml format for {path}: {errors}")
-            exit(1)
+            raise SchemaError(f"Wrong yaml format for {path}: {errors}")
 
         # add kind verification to spec
         schema["spec"]["kind"] = {
@@ -94,9 +136,18 @@ class Schema(YamlConfig):
         return Schema(schema["metadata"], schema["spec"])
 
     @staticmethod
-    def load_all(path: str = DEFAULT_SCHEMA_PATH) -> SchemaRegistry:
+    def load_all(path: Optional[str] = None) -> SchemaRegistry:
         """
-        Loads all schemas from `path`
+        Loads all schemas from `path`, or the packaged schemas if no path is given
+        """
+        if path is not None:
+            return Schema.load_folder(path)
+        return Schema.load_packaged()
+
+    @staticmethod
+    def load_folder(path: str) -> SchemaRegistry:
+        """
+        Loads all schema files in a folder
         """
         schemes: SchemaRegistry = {}
 
@@ -111,3 +162,53 @@ class Schema(YamlConfig):
             schemes[schema.name] = schema
 
         return schemes
+
+    @staticmethod
+    def load_packaged() -> SchemaRegistry:
+        """
+        Loads the packaged schemas, using the pre-validated registry of an earlier run if it is up to date
+        """
+        files: dict[str, str] = {
+            entry.name: entry.read_text(encoding="utf8")
+            for entry in Schema.SCHEMA_RESOURCES.iterdir()
+            if entry.is_file()
+        }
+
+        # the code of this module guards against changes of the master schema and the parsing, which
+        # a checkout does not bump the version for, the schema files against edited schemas
+        digest = hashlib.sha256(__version__.encode("utf8"))
+        digest.update(resources.files(__package__).joinpath("schema.py").read_bytes())
+        for name in sorted(files):
+            digest.update(name.encode("utf8") + b"\0" + files[name].encode("utf8"))
+        cache_file = os.path.join(
+            user_cache_dir(), f"schemas-{__version__}-{digest.hexdigest()[:16]}.pickle"
+        )
+
+        try:
+            with open(cache_file, "rb") as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            pass
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as err:
+            logger.debug(f"Ignoring schema cache {cache_file}: {err}")
+
+        schemes: SchemaRegistry = {}
+        for name, contents in files.items():
+            try:
+                data = yaml.safe_load(contents)
+            except yaml.YAMLError as err:
+                raise SchemaError(f"Error parsing schema '{name}': {err}") from err
+            schema = Schema.parse(data, name)
+            schemes[schema.name] = schema
+
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            # write to a temporary file first, so concurrent runs never read partial caches
+            temp_file = f"{cache_file}.{os.getpid()}"
+            with open(temp_file, "wb") as file:
+                pickle.dump(schemes, file)
+            os.replace(temp_file, cache_file)
+        except OSError as err:
+            logger.debug(f"Could not write schema cache {cache_file}: {err}")
+
+        return schemes
@@ -0,0 +1,350 @@
+"""
+Serves the transpiler over HTTP, keeping the templates and compiled templates warm between requests
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import tarfile
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+import yaml
+from loguru import logger
+
+from .errors import ConfigError, MultiformError, UsageError
+from .session import Multiform
+from .tags import RefTag, architecture_loader
+from .template import compile_stats
+from .watch import create_watcher
+
+# upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS: list[float] = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+# requests with larger architectures are rejected
+MAX_BODY_SIZE: int = 64 * 1024 * 1024
+# paths that are recorded in the metrics, all others are recorded as "other"
+ENDPOINTS: list[str] = ["/render", "/metrics", "/healthz"]
+
+
+def decode_json(value: dict) -> any:
+    """
+    Turns the `{"!ref": name}` objects of JSON architectures into references
+    """
+    if list(value.keys()) == ["!ref"]:
+        return RefTag(value["!ref"])
+    return value
+
+
+class Metrics:
+    """
+    Counts the requests and records their latencies, exposed in the Prometheus text format
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.requests: Counter = Counter()
+        self.buckets: dict[str, list[int]] = {}
+        self.sums: Counter = Counter()
+        self.counts: Counter = Counter()
+        self.reloads = 0
+
+    def observe(self, endpoint: str, status: int, seconds: float) -> None:
+        """
+        Records a finished request
+        """
+        if endpoint not in ENDPOINTS:
+            endpoint = "other"
+        with self.lock:
+            self.requests[(endpoint, status)] += 1
+            buckets = self.buckets.setdefault(endpoint, [0] * len(LATENCY_BUCKETS))
+            index = bisect_left(LATENCY_BUCKETS, seconds)
+            if index < len(buckets):
+                buckets[index] += 1
+            self.sums[endpoint] += seconds
+            self.counts[endpoint] += 1
+
+    def reloaded(self) -> None:
+        """
+        Records a reload of the templates
+        """
+        with self.lock:
+            self.reloads += 1
+
+    def render(self) -> str:
+        """
+        Returns the metrics in the Prometheus text format
+        """
+        lines: list[str] = [
+            "# TYPE multiform_requests_total counter",
+        ]
+        with self.lock:
+            for (endpoint, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'multiform_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}'
+                )
+
+            lines.append("# TYPE multiform_request_duration_seconds histogram")
+            for endpoint, buckets in sorted(self.buckets.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, buckets):
+                    cumulative += count
+                    lines.append(
+                        f'multiform_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'multiform_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {self.counts[endpoint]}'
+                )
+                lines.append(
+                    f'multiform_request_duration_seconds_sum{{endpoint="{endpoint}"}} {self.sums[endpoint]:.6f}'
+                )
+                lines.append(
+                    f'multiform_request_duration_seconds_count{{endpoint="{endpoint}"}} {self.counts[endpoint]}'
+                )
+
+            lines += [
+                "# TYPE multiform_template_reloads_total counter",
+                f"multiform_template_reloads_total {self.reloads}",
+            ]
+
+        lines += [
+            "# TYPE multiform_template_cache_hits_total counter",
+            f"multiform_template_cache_hits_total {compile_stats.hits}",
+            "# TYPE multiform_template_cache_misses_total counter",
+            f"multiform_template_cache_misses_total {compile_stats.misses}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class RenderServer(HTTPServer):
+    """
+    HTTP server that handles the requests in a pool of worker threads
+    """
+
+    def __init__(
+        self, address: tuple[str, int], session: Multiform, workers: int
+    ) -> None:
+        super().__init__(address, RenderRequestHandler)
+        self.session = session
+        self.metrics = Metrics()
+        self.pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="multiform-render"
+        )
+
+    def process_request(self, request, client_address) -> None:
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address) -> None:
+        """
+        Handles a request inside a worker thread
+        """
+        try:
+            self.finish_request(request, client_address)
+        except Exception:  # pylint: disable=broad-except
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles the requests of the render service
+
+    `POST /render` renders the architecture in the body (YAML, or JSON with `{"!ref": name}` references)
+    and returns a tar stream, or JSON if `format=json` is given or JSON is accepted. `only`, `type` and
+    `platform` query parameters select components and platforms like the transpile flags.
+    `GET /metrics` returns the metrics and `GET /healthz` checks that the service is up.
+    """
+
+    server: RenderServer
+    server_version = "multiform"
+
+    def log_message(self, format: str, *args: any) -> None:
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """
+        Serves the metrics and the health check, the name is fixed by `BaseHTTPRequestHandler`
+        """
+        start = time.perf_counter()
+        path = urlparse(self.path).path
+        if path == "/metrics":
+            status = self.send(
+                HTTPStatus.OK,
+                self.server.metrics.render().encode("utf8"),
+                "text/plain; version=0.0.4",
+            )
+        elif path == "/healthz":
+            status = self.send(HTTPStatus.OK, b"ok\n", "text/plain")
+        else:
+            status = self.send_error_json(HTTPStatus.NOT_FOUND, f"Unknown path {path}")
+        self.server.metrics.observe(path, status, time.perf_counter() - start)
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """
+        Serves the render requests, the name is fixed by `BaseHTTPRequestHandler`
+        """
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path != "/render":
+            status = self.send_error_json(
+                HTTPStatus.NOT_FOUND, f"Unknown path {url.path}"
+            )
+        else:
+            status = self.render(parse_qs(url.query))
+        self.server.metrics.observe(url.path, status, time.perf_counter() - start)
+
+    def render(self, query: dict[str, list[str]]) -> int:
+        """
+        Renders the architecture of the request, returning the status code
+        """
+        try:
+            architecture = self.read_architecture()
+            files = self.server.session.render(
+                architecture,
+                query.get("only"),
+                query.get("type"),
+                query.get("platform"),
+            )
+        except MultiformError as err:
+            return self.send_error_json(HTTPStatus.BAD_REQUEST, str(err), err.errors)
+        except Exception as err:  # pylint: disable=broad-except
+            # e.g. a runtime error of a template, the client still gets a response
+            logger.exception(f"Failed to render the architecture: {err}")
+            return self.send_error_json(
+                HTTPStatus.INTERNAL_SERVER_ERROR, f"Internal error: {err}"
+            )
+
+        if query.get("format", [""])[0] == "json" or (
+            "format" not in query
+            and "application/json" in self.headers.get("Accept", "")
+        ):
+            return self.send(
+                HTTPStatus.OK,
+                json.dumps({"files": files}).encode("utf8"),
+                "application/json",
+            )
+        return self.send(
+            HTTPStatus.OK, RenderRequestHandler.tar(files), "application/x-tar"
+        )
+
+    def read_architecture(self) -> dict:
+        """
+        Reads and parses the architecture from the request body
+        """
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_BODY_SIZE:
+            raise UsageError(
+                f"The request needs an architecture of at most {MAX_BODY_SIZE} bytes"
+            )
+        body = self.rfile.read(length)
+
+        try:
+            if "json" in self.headers.get("Content-Type", ""):
+                data = json.loads(body, object_hook=decode_json)
+            else:
+                data = yaml.load(body, Loader=architecture_loader())
+        except (ValueError, yaml.YAMLError) as err:
+            raise ConfigError(f"Error parsing the architecture: {err}") from err
+        if not isinstance(data, dict):
+            raise ConfigError("The architecture must be a mapping")
+        return data
+
+    @staticmethod
+    def tar(files: dict[str, str]) -> bytes:
+        """
+        Packs the rendered files into a tar archive
+        """
+        buffer = io.BytesIO()
+        mtime = time.time()
+        with tarfile.open(fileobj=buffer, mode="w") as archive:
+            for path, contents in files.items():
+                data = contents.encode("utf8")
+                info = tarfile.TarInfo(path)
+                info.size = len(data)
+                info.mtime = mtime
+                archive.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+    def send(self, status: HTTPStatus, body: bytes, content_type: str) -> int:
+        """
+        Sends a complete response, returning the status code
+        """
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return status.value
+
+    def send_error_json(
+        self, status: HTTPStatus, message: str, errors: Optional[list[str]] = None
+    ) -> int:
+        """
+        Sends an error as JSON, returning the status code
+        """
+        body = json.dumps({"error": message, "errors": errors or []})
+        return self.send(status, body.encode("utf8"), "application/json")
+
+
+def reload_templates(
+    session: Multiform, metrics: Metrics, poll: bool, interval: float
+) -> None:
+    """
+    Loads the templates again whenever they change, keeping the last good templates on errors
+    """
+    watcher = create_watcher([session.template_dir], poll, interval)
+    while True:
+        watcher.wait()
+        logger.info("Templates changed, reloading...")
+        try:
+            session.reload_templates()
+        except MultiformError as err:
+            logger.error(f"Keeping the previous templates: {err}")
+            continue
+        metrics.reloaded()
+        logger.success("Reloaded templates")
+
+
+def serve(
+    template_dir: str,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    template_cache: Optional[str] = None,
+    workers: int = 4,
+    poll: bool = False,
+    interval: float = 0.5,
+) -> None:
+    """
+    Serves the render service until interrupted
+    """
+    session = Multiform(template_dir, template_cache)
+    server = RenderServer((host, port), session, workers)
+
+    threading.Thread(
+        target=reload_templates,
+        args=(session, server.metrics, poll, interval),
+        name="multiform-reload",
+        daemon=True,
+    ).start()
+
+    logger.success(
+        f"Serving on http://{server.server_address[0]}:{server.server_address[1]} with {workers} workers"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopped serving")
+    finally:
+        server.server_close()
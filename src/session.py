@@ -0,0 +1,249 @@
+"""
+Contains the Multiform class, the Python API of the transpiler
+"""
+
+import copy
+import os
+from typing import Optional, Union
+
+import jinja2
+from loguru import logger
+
+from .architecture import ArchitectureConfig
+from .cache import RenderCache
+from .common import check_architecture, create_environment, load_architecture
+from .errors import UsageError
+from .schema import Schema, SchemaRegistry
+from .sink import MemorySink, sink_format
+from .timing import Profiler
+from .transpiler import (
+    RenderJob,
+    TemplateLibrary,
+    TranspileOptions,
+    collect_jobs,
+    find_architectures,
+    load_templates,
+    select_components,
+    select_platforms,
+    transpile_architecture,
+    transpile_batch,
+    transpile_variants,
+    validate_components,
+)
+
+
+class Multiform:
+    """
+    A transpilation session that keeps the schemas, templates and compiled templates loaded
+
+    Architectures can be given as a path or as a dict with the structure of an architecture file,
+    using `RefTag` for references. Errors are raised as `MultiformError`.
+    """
+
+    def __init__(
+        self,
+        templates: str,
+        template_cache: Optional[str] = None,
+        profiler: Optional[Profiler] = None,
+    ) -> None:
+        self.template_dir = templates
+        self.template_cache = template_cache
+        self.profiler = profiler or Profiler()
+
+        with self.profiler.phase("schemaLoad"):
+            self.env: jinja2.Environment = create_environment(template_cache)
+            logger.info("Reading and validation schemas...")
+            self.schema_registry: SchemaRegistry = Schema.load_all()
+
+        self.library: TemplateLibrary = self.load_library()
+
+    def load_library(self) -> TemplateLibrary:
+        """
+        Loads the templates from the template directory or bundle
+        """
+        with self.profiler.phase("templateLoad"):
+            _, template_registry, special_registry = load_templates(
+                self.template_dir, self.schema_registry
+            )
+        return TemplateLibrary(
+            self.schema_registry, template_registry, special_registry
+        )
+
+    def reload_templates(self) -> None:
+        """
+        Loads the templates again, e.g. after they were changed on disk
+        """
+        self.library = self.load_library()
+
+    def architecture(
+        self,
+        architecture: Union[str, dict, ArchitectureConfig],
+        architecture_cache: Optional[str] = None,
+    ) -> ArchitectureConfig:
+        """
+        Loads and validates an architecture from a path or a dict
+        """
+        if isinstance(architecture, ArchitectureConfig):
+            return architecture
+        if isinstance(architecture, dict):
+            config = ArchitectureConfig.from_data(architecture, self.schema_registry)
+            check_architecture(config)
+            return config
+        return load_architecture(architecture, self.schema_registry, architecture_cache)
+
+    def jobs(
+        self,
+        architecture: Union[str, dict, ArchitectureConfig],
+        only: Optional[list[str]] = None,
+        types: Optional[list[str]] = None,
+        platforms: Optional[list[str]] = None,
+    ) -> list[RenderJob]:
+        """
+        Validates the selected components and returns the outputs to render
+        """
+        return self.select_jobs(
+            self.library, self.architecture(architecture), only, types, platforms
+        )
+
+    def render(
+        self,
+        architecture: Union[str, dict, ArchitectureConfig],
+        only: Optional[list[str]] = None,
+        types: Optional[list[str]] = None,
+        platforms: Optional[list[str]] = None,
+    ) -> dict[str, str]:
+        """
+        Renders an architecture in memory, returning the contents of every output file
+        by its path relative to the output directory, e.g. `aws/main.tf`
+        """
+        # the templates can be reloaded by another thread, so every call uses the library it started with
+        library = self.library
+        templates = library.templates()
+        jobs = self.select_jobs(
+            library, self.architecture(architecture), only, types, platforms
+        )
+        sink = MemorySink(list(dict.fromkeys(x.platform for x in jobs)))
+        for job in jobs:
+            job.run(templates, self.env, sink)
+        return sink.files
+
+    @staticmethod
+    def select_jobs(
+        library: TemplateLibrary,
+        config: ArchitectureConfig,
+        only: Optional[list[str]],
+        types: Optional[list[str]],
+        platforms: Optional[list[str]],
+    ) -> list[RenderJob]:
+        """
+        Validates the selected components against the templates of `library` and returns the outputs to render
+        """
+        selected_platforms = config.platforms()
+        if platforms:
+            selected_platforms = select_platforms(selected_platforms, platforms)
+        components = select_components(config, only, types)
+        validate_components(config, components, library.template_registry)
+        return collect_jobs(config, selected_platforms, components)
+
+    def transpile(
+        self,
+        architectures: list[str],
+        out_dir: str,
+        options: Optional[TranspileOptions] = None,
+        trace: Optional[str] = None,
+        overlays: Optional[list[str]] = None,
+    ) -> None:
+        """
+        Transpiles architecture files to disk
+
+        A single architecture file is written to `out_dir`, rendering the files in `options.workers`
+        processes. Instead of a directory, `out_dir` can be an archive or `-` to stream a tar archive
+        to stdout, see `sink_format`. Several files, or a folder of them, are written to a folder per
+        architecture below `out_dir`, and so are the variants of a single architecture given by
+        `overlays`. The time spent in each phase is added to the report and optionally written to
+        a `trace` file.
+        """
+        # the options of the caller are not changed
+        options = copy.copy(options) if options else TranspileOptions()
+        # render workers use the same compiled templates as the session
+        options.template_cache = options.template_cache or self.template_cache
+
+        batch = len(architectures) > 1 or any(os.path.isdir(x) for x in architectures)
+        if batch and overlays:
+            raise UsageError("Overlays can only be applied to a single architecture")
+        if batch or overlays:
+            if options.report_file or trace:
+                raise UsageError(
+                    "--report-file and --trace can only be used with a single architecture without overlays"
+                )
+            if sink_format(out_dir, options.output_format) != "directory":
+                raise UsageError(
+                    "Several architectures or variants can only be written to an output directory"
+                )
+
+        # the next transpilation starts a new profile
+        profiler, self.profiler = self.profiler, Profiler()
+        if overlays:
+            transpile_variants(
+                architectures[0],
+                overlays,
+                out_dir,
+                self.library,
+                self.env,
+                options,
+                profiler,
+            )
+        elif batch:
+            transpile_batch(
+                find_architectures(architectures),
+                out_dir,
+                self.library,
+                self.env,
+                options,
+            )
+        else:
+            transpile_architecture(
+                architectures[0], out_dir, self.library, self.env, options, profiler
+            )
+            if trace:
+                logger.info(f"Saving trace to {trace}...")
+                profiler.save_trace(trace)
+        self.prune_render_cache(options)
+
+    def plan(
+        self,
+        architecture: str,
+        out_dir: str,
+        options: Optional[TranspileOptions] = None,
+    ) -> list[dict]:
+        """
+        Transpiles an architecture file in memory and compares it with `out_dir` without writing anything,
+        returning the files that would be created, updated or deleted, see `PlanSink`
+        """
+        options = copy.copy(options) if options else TranspileOptions()
+        options.template_cache = options.template_cache or self.template_cache
+        options.plan = True
+
+        if os.path.isdir(architecture):
+            raise UsageError("--plan can only be used with a single architecture")
+        if sink_format(out_dir, options.output_format) != "directory":
+            raise UsageError("--plan can only compare with an output directory")
+        if options.report:
+            raise UsageError("--plan never writes, so it cannot write a report")
+
+        profiler, self.profiler = self.profiler, Profiler()
+        stats = transpile_architecture(
+            architecture, out_dir, self.library, self.env, options, profiler
+        )
+        self.prune_render_cache(options)
+        return stats["plan"]
+
+    @staticmethod
+    def prune_render_cache(options: TranspileOptions) -> None:
+        """
+        Evicts the least recently used renders once the render cache exceeds its size limit
+        """
+        if options.render_cache:
+            RenderCache(
+                options.render_cache, options.render_cache_size * 1024 * 1024
+            ).prune()
@@ -0,0 +1,365 @@
+"""
+Contains the output sinks the rendered files are written to
+"""
+
+from __future__ import annotations
+
+import difflib
+import hashlib
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from abc import ABC, abstractmethod
+from collections import Counter
+from io import BytesIO
+from typing import BinaryIO, Optional
+
+from loguru import logger
+
+from .manifest import CREATED, DELETED, UNCHANGED, UPDATED, Manifest
+from .writer import AtomicWriter, remove_temp_files
+
+SINK_FORMATS: list[str] = ["directory", "tar", "tgz", "zip"]
+# archive formats that are detected from the extension of the output path
+ARCHIVE_EXTENSIONS: dict[str, str] = {
+    ".tar": "tar",
+    ".tar.gz": "tgz",
+    ".tgz": "tgz",
+    ".zip": "zip",
+}
+# the output path that writes an archive to stdout
+STDOUT: str = "-"
+# the markers of the changes in a plan
+PLAN_MARKERS: dict[str, str] = {CREATED: "+", UPDATED: "~", DELETED: "-"}
+
+
+def sink_format(output: str, output_format: Optional[str] = None) -> str:
+    """
+    Returns the format of the sink for an output path, detecting archives by their extension
+    """
+    if output_format is not None:
+        return output_format
+    if output == STDOUT:
+        return "tar"
+    for extension, archive_format in ARCHIVE_EXTENSIONS.items():
+        if output.endswith(extension):
+            return archive_format
+    return "directory"
+
+
+def create_sink(
+    output: str,
+    platforms: list[str],
+    output_format: Optional[str] = None,
+    fsync: bool = False,
+) -> OutputSink:
+    """
+    Opens the sink for an output directory, an archive file or `-` for stdout
+    """
+    archive_format = sink_format(output, output_format)
+    if archive_format == "directory":
+        return DirectorySink(output, platforms, fsync)
+    return ArchiveSink(output, archive_format, platforms)
+
+
+class OutputSink(ABC):
+    """
+    Receives the rendered files of a transpilation, addressed by platform and file name
+
+    `write` returns the status and entry of a file and `record` adds them to the sink, so that
+    sinks which are `parallel` can be written to from render workers using a copy of the sink.
+    The files of all other sinks are written by the process that owns the sink. `finish` completes
+    the output and returns the number of files per status and platform.
+    """
+
+    # whether render worker processes can write to a copy of the sink
+    parallel: bool = False
+
+    def __init__(self, platforms: list[str]) -> None:
+        self.changes: dict[str, Counter] = {x: Counter() for x in platforms}
+
+    def __enter__(self) -> OutputSink:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def path(self, platform: str, name: str) -> str:
+        """
+        Returns the path of a file as shown in the report
+        """
+        return f"{platform}/{name}"
+
+    @abstractmethod
+    def write(
+        self, platform: str, name: str, component: str, contents: str
+    ) -> tuple[str, dict]:
+        """
+        Writes the file `name` of `component`, returning the status and the entry of the file
+        """
+
+    def record(self, platform: str, _name: str, status: str, _entry: dict) -> None:
+        """
+        Records the result of `write`
+        """
+        self.changes[platform][status] += 1
+
+    def finish(self, _keep: Optional[set[str]] = None) -> dict[str, dict[str, int]]:
+        """
+        Completes the output, returning the number of created, updated, unchanged and deleted files per platform
+
+        The files of the components to keep were not rendered and are kept if the sink supports it.
+        """
+        return {
+            platform: {
+                status: changes[status]
+                for status in [CREATED, UPDATED, UNCHANGED, DELETED]
+            }
+            for platform, changes in self.changes.items()
+        }
+
+    def close(self) -> None:
+        """
+        Releases the files of the sink, also if the output was not finished
+        """
+
+
+class DirectorySink(OutputSink):
+    """
+    Writes the files to a folder per platform, skipping unchanged files and pruning stale ones using the manifests
+
+    Files are replaced atomically by a pool of threads and the folders are flushed to disk before
+    the manifests are saved, see `AtomicWriter`.
+    """
+
+    parallel = True
+
+    def __init__(self, out_dir: str, platforms: list[str], fsync: bool = False) -> None:
+        super().__init__(platforms)
+        logger.info("Perparing output directories...")
+        self.writer = AtomicWriter(fsync=fsync)
+        self.manifests: dict[str, Manifest] = {}
+        for platform in platforms:
+            folder = os.path.join(out_dir, platform)
+            os.makedirs(folder, exist_ok=True)
+            remove_temp_files(folder)
+            self.manifests[platform] = Manifest.load(folder)
+
+    def path(self, platform: str, name: str) -> str:
+        return os.path.join(self.manifests[platform].folder, name)
+
+    def write(
+        self, platform: str, name: str, component: str, contents: str
+    ) -> tuple[str, dict]:
+        return self.manifests[platform].sync(name, component, contents, self.writer)
+
+    def record(self, platform: str, name: str, status: str, entry: dict) -> None:
+        self.manifests[platform].record(name, status, entry)
+
+    def finish(self, keep: Optional[set[str]] = None) -> dict[str, dict[str, int]]:
+        self.writer.wait()
+        for manifest in self.manifests.values():
+            for path in manifest.prune(keep):
+                logger.debug(f"Deleted stale file {path}")
+        # the manifests must not list files that are not on disk yet
+        self.writer.sync([x.folder for x in self.manifests.values()])
+        for manifest in self.manifests.values():
+            manifest.save(self.writer.fsync)
+        return {
+            platform: manifest.summary()
+            for platform, manifest in self.manifests.items()
+        }
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class PlanSink(OutputSink):
+    """
+    Compares the files with the output directory instead of writing them, collecting the files that would be
+    created, updated or deleted
+
+    Unchanged files are detected with the manifests like in `DirectorySink`, so only files whose size
+    and modification time changed are read. Nothing is written or deleted, not even the manifests. With
+    `diff`, every change gets a unified diff against the current file.
+    """
+
+    parallel = True
+
+    def __init__(self, out_dir: str, platforms: list[str], diff: bool = False) -> None:
+        super().__init__(platforms)
+        self.diff = diff
+        self.manifests: dict[str, Manifest] = {
+            x: Manifest.load(os.path.join(out_dir, x)) for x in platforms
+        }
+        self.plan: list[dict] = []
+
+    def path(self, platform: str, name: str) -> str:
+        return os.path.join(self.manifests[platform].folder, name)
+
+    def write(
+        self, platform: str, name: str, component: str, contents: str
+    ) -> tuple[str, dict]:
+        data = contents.encode("utf8")
+        digest = hashlib.sha256(data).hexdigest()
+        manifest = self.manifests[platform]
+        entry = manifest.check(name, component, data, digest)
+        if entry is not None:
+            return UNCHANGED, entry
+
+        path = self.path(platform, name)
+        status = CREATED if Manifest.stat(path) is None else UPDATED
+        entry = Manifest.entry(digest, len(data), 0, component)
+        if self.diff:
+            entry["diff"] = PlanSink.unified_diff(path, contents, status)
+        return status, entry
+
+    def record(self, platform: str, name: str, status: str, entry: dict) -> None:
+        diff: Optional[str] = entry.pop("diff", None)
+        self.manifests[platform].record(name, status, entry)
+        if status != UNCHANGED:
+            self.plan.append(
+                {"path": self.path(platform, name), "status": status, "diff": diff}
+            )
+
+    def finish(self, keep: Optional[set[str]] = None) -> dict[str, dict[str, int]]:
+        for manifest in self.manifests.values():
+            for path in manifest.prune(keep, delete=False):
+                self.plan.append(
+                    {
+                        "path": path,
+                        "status": DELETED,
+                        "diff": (
+                            PlanSink.unified_diff(path, "", DELETED)
+                            if self.diff
+                            else None
+                        ),
+                    }
+                )
+        self.plan.sort(key=lambda x: x["path"])
+        return {
+            platform: manifest.summary()
+            for platform, manifest in self.manifests.items()
+        }
+
+    @staticmethod
+    def unified_diff(path: str, contents: str, status: str) -> str:
+        """
+        Returns the unified diff between the current file and the new contents
+        """
+        current = ""
+        if status != CREATED:
+            with open(path, "r", encoding="utf8", errors="replace") as file:
+                current = file.read()
+        lines = difflib.unified_diff(
+            current.splitlines(keepends=True),
+            contents.splitlines(keepends=True),
+            "/dev/null" if status == CREATED else path,
+            "/dev/null" if status == DELETED else path,
+        )
+        return "".join(
+            x if x.endswith("\n") else x + "\n\\ No newline at end of file\n"
+            for x in lines
+        )
+
+
+def format_plan(plan: list[dict]) -> str:
+    """
+    Formats the changes of a `PlanSink` as one line per file, followed by the diffs and a summary
+    """
+    lines: list[str] = [f"{PLAN_MARKERS[x['status']]} {x['path']}\n" for x in plan]
+    for change in plan:
+        if change["diff"]:
+            lines.append("\n" + change["diff"])
+
+    counts = Counter(x["status"] for x in plan)
+    if len(plan) == 0:
+        lines.append("No changes, the output is up to date.\n")
+    else:
+        lines.append(
+            f"\nPlan: {counts[CREATED]} to create, {counts[UPDATED]} to update, {counts[DELETED]} to delete.\n"
+        )
+    return "".join(lines)
+
+
+class ArchiveSink(OutputSink):
+    """
+    Streams the files into a tar, gzipped tar or zip archive, written to a file or to stdout
+
+    Archives are always written from scratch, so every file is created and nothing is pruned.
+    """
+
+    def __init__(self, output: str, archive_format: str, platforms: list[str]) -> None:
+        super().__init__(platforms)
+        self.output = output
+        self.mtime = time.time()
+
+        # the handles stay open for all writes and are closed in `close`
+        # pylint: disable=consider-using-with
+        if output == STDOUT:
+            logger.info(f"Streaming {archive_format} archive to stdout...")
+            self.stream: BinaryIO = sys.stdout.buffer
+        else:
+            logger.info(f"Streaming {archive_format} archive to {output}...")
+            os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+            self.stream = open(output, "wb")
+
+        self.tar: Optional[tarfile.TarFile] = None
+        self.zip: Optional[zipfile.ZipFile] = None
+        if archive_format == "zip":
+            self.zip = zipfile.ZipFile(self.stream, "w", zipfile.ZIP_DEFLATED)
+        else:
+            # stream modes never seek, so stdout and pipes work
+            self.tar = tarfile.open(
+                fileobj=self.stream, mode="w|gz" if archive_format == "tgz" else "w|"
+            )
+
+    def write(
+        self, platform: str, name: str, component: str, contents: str
+    ) -> tuple[str, dict]:
+        data = contents.encode("utf8")
+        path = self.path(platform, name)
+        if self.zip is not None:
+            info = zipfile.ZipInfo(path, time.localtime(self.mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            self.zip.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            info.mtime = self.mtime
+            self.tar.addfile(info, BytesIO(data))
+        return CREATED, {"size": len(data), "component": component}
+
+    def finish(self, keep: Optional[set[str]] = None) -> dict[str, dict[str, int]]:
+        self.close()
+        return super().finish(keep)
+
+    def close(self) -> None:
+        if self.zip is not None:
+            self.zip.close()
+            self.zip = None
+        if self.tar is not None:
+            self.tar.close()
+            self.tar = None
+        if self.stream is sys.stdout.buffer:
+            self.stream.flush()
+        elif not self.stream.closed:
+            self.stream.close()
+
+
+class MemorySink(OutputSink):
+    """
+    Keeps the files in memory by their path relative to the output directory, e.g. `aws/main.tf`
+    """
+
+    def __init__(self, platforms: list[str]) -> None:
+        super().__init__(platforms)
+        self.files: dict[str, str] = {}
+
+    def write(
+        self, platform: str, name: str, component: str, contents: str
+    ) -> tuple[str, dict]:
+        self.files[self.path(platform, name)] = contents
+        return CREATED, {"size": len(contents.encode("utf8")), "component": component}
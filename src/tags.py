@@ -18,6 +18,12 @@ class RefTag(yaml.YAMLObject):
     def __repr__(self):
         return self.value  # transiently return our value
 
+    def __eq__(self, other):
+        return isinstance(other, RefTag) and self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
     @classmethod
     def from_yaml(cls, loader: yaml.Loader, node: dict):
         return RefTag(node.value)
@@ -27,22 +33,88 @@ class RefTag(yaml.YAMLObject):
         return dumper.represent_scalar(cls.__yaml_tag, data.value)
 
 
+class IncludeTag(yaml.YAMLObject):
+    """
+    Custom tag for including the platforms or components of other files, which can be a glob pattern
+    """
+
+    __yaml_tag = "!include"
+
+    def __init__(self, value: str):
+        self.value = value
+
+    def __repr__(self):
+        return f"!include {self.value}"
+
+    def __eq__(self, other):
+        return isinstance(other, IncludeTag) and self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+    @classmethod
+    def from_yaml(cls, loader: yaml.Loader, node: dict):
+        return IncludeTag(node.value)
+
+    @classmethod
+    def to_yaml(cls, dumper: yaml.Dumper, data: dict):
+        return dumper.represent_scalar(cls.__yaml_tag, data.value)
+
+
+# use the libyaml bindings if PyYAML was built with them
+BaseSafeLoader: type = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class SafeLoader(BaseSafeLoader):
+    """
+    Safe PyYAML loader, backed by libyaml if available
+    """
+
+
+class ArchitectureLoader(SafeLoader):
+    """
+    Loader for architecture definitions
+    """
+
+
+# add_constructor copies the constructors of the base class, so the PyYAML loaders stay untouched
+ArchitectureLoader.add_constructor("!ref", RefTag.from_yaml)
+ArchitectureLoader.add_constructor("!include", IncludeTag.from_yaml)
+
+
+class ArchitectureDumper(yaml.SafeDumper):
+    """
+    Dumper for architecture definitions
+    """
+
+
+ArchitectureDumper.add_multi_representer(RefTag, RefTag.to_yaml)
+ArchitectureDumper.add_multi_representer(IncludeTag, IncludeTag.to_yaml)
+
+
+class ReportDumper(getattr(yaml, "CSafeDumper", yaml.SafeDumper)):
+    """
+    Dumper for reports, backed by libyaml if available
+    """
+
+    def ignore_aliases(self, data: any) -> bool:
+        return True  # disable aliases
+
+
+# the debug report contains the component properties, which can contain references
+ReportDumper.add_multi_representer(RefTag, RefTag.to_yaml)
+
+
 def architecture_loader():
-    """Add constructors to PyYAML loader"""
-    loader = yaml.SafeLoader
-    loader.add_constructor("!ref", RefTag.from_yaml)
-    return loader
+    """Returns the PyYAML loader for architecture definitions"""
+    return ArchitectureLoader
 
 
 def architecture_dumper():
-    """Add representers to PyYAML dumper"""
-    dumper = yaml.SafeDumper
-    dumper.add_multi_representer(RefTag, RefTag.to_yaml)
-    return dumper
+    """Returns the PyYAML dumper for architecture definitions"""
+    return ArchitectureDumper
 
 
 def report_dumper():
     """Custom PyYAML dumper for reports"""
-    dumper = yaml.SafeDumper
-    dumper.ignore_aliases = lambda *args: True  # disable aliases
-    return dumper
+    return ReportDumper
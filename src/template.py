@@ -4,17 +4,33 @@ Contains the template classes
 
 from __future__ import annotations
 
+import hashlib
+import marshal
 import os
+import threading
+from types import CodeType
 from typing import Optional, Type
 
+import cerberus
 import jinja2
+import jinja2.meta
 from loguru import logger
 
 from . import utils
+from .cache import CacheStats, RenderCache
 from .config import YamlConfig
+from .errors import SchemaError, TemplateError
 from .schema import Schema
+from .sink import OutputSink
 from .validator import PropertyValidator
 
+# counts how often a compiled template could be reused instead of compiling it
+compile_stats: CacheStats = CacheStats()
+# counts how often a rendered file could be taken from the render cache
+render_stats: CacheStats = CacheStats()
+# parses templates for the static analysis, which does not depend on the environment they are rendered with
+ANALYSIS_ENV: jinja2.Environment = jinja2.Environment()
+
 
 class TemplateConfig(YamlConfig):
     """
@@ -30,7 +46,9 @@ class TemplateConfig(YamlConfig):
         """
         Creates a TemplateRoot from a path and a schema
         """
-        data: dict = utils.load_yaml_and_validate_handle_errors(path, schema.spec)
+        data: dict = utils.load_yaml_and_validate_handle_errors(
+            path, None, validator=schema.validator()
+        )
 
         return base_type(schema, data.get("metadata"), data["spec"], **kwargs)
 
@@ -75,46 +93,78 @@ class TemplateDefinition(TemplateConfig):
         super().__init__(schema, metadata, spec)
         self.template_type = template_type
         self.template_files = template_files
+        # validators keep the state of the running validation, so every thread gets its own
+        self.validators: dict[int, PropertyValidator] = {}
+        # normalizing copies the schema for every component, so it is skipped if it would not change anything
+        self.normalize: bool = utils.has_normalization_rules(
+            self.spec.get("properties")
+        )
 
-    def validate_properties(self, data: dict, components: list[dict]) -> bool:
+    def __getstate__(self) -> dict:
+        # validators are rebuilt on demand
+        return self.__dict__ | {"validators": {}}
+
+    def validator(self, components: dict[str, dict]) -> PropertyValidator:
+        """
+        Returns the validator of the properties, which is only built once per thread,
+        resolving references with the component index `components`
         """
-        Validates the properties of the template
+        key = threading.get_ident()
+        if key not in self.validators:
+            try:
+                self.validators[key] = PropertyValidator(
+                    self.spec["properties"], components=components
+                )
+            except cerberus.schema.SchemaError as err:
+                raise SchemaError(
+                    f"Error parsing the properties of template `{self.template_type}`: {err}"
+                ) from err
+        validator = self.validators[key]
+        validator.use_components(components)
+        return validator
+
+    def validate_properties(
+        self, data: dict, components: dict[str, dict]
+    ) -> Optional[str]:
         """
+        Validates the properties of the template, resolving references with the component index `components`
+
+        Returns the problem if the properties are invalid.
+        """
+        # components can omit their properties or set them to null
+        data = data or {}
         if "properties" not in self.spec or self.spec["properties"] is None:
             if len(data.items()) > 0:
-                logger.error(
-                    f"Template `{self.template_type}` has no properties defined, but provided component data has properties"
-                )
-                return False
+                return f"Template `{self.template_type}` has no properties defined, but provided component data has properties"
             else:
-                return True
+                return None
         success, errors = utils.validate(
-            data,
-            self.spec["properties"],
-            validator=PropertyValidator(components=components),
+            data, None, self.validator(components), self.normalize
         )
 
         if not success:
-            logger.error(
-                f"Wrong properties for template `{self.template_type}`: {errors}"
-            )
-            return False
+            return f"Wrong properties for template `{self.template_type}`: {errors}"
         else:
-            return True
+            return None
 
-    def render(
-        self, platform: str, env: jinja2.Environment, data: dict
-    ) -> Optional[list[RenderedFile]]:
+    def files(self, platform: str) -> list[TemplateFile]:
         """
-        Renders the template files for a given platform
+        Returns the template files for a given platform
         """
         if not platform in self.template_files:
-            logger.error(
+            raise TemplateError(
                 f"No definition of template `{self.template_type}` found for platform `{platform}`."
             )
-            exit(1)
 
-        return list(map(lambda x: x.render(env, data), self.template_files[platform]))
+        return self.template_files[platform]
+
+    def render(
+        self, platform: str, env: jinja2.Environment, data: dict
+    ) -> Optional[list[RenderedFile]]:
+        """
+        Renders the template files for a given platform
+        """
+        return list(map(lambda x: x.render(env, data), self.files(platform)))
 
     @staticmethod
     def parse_template(
@@ -137,7 +187,9 @@ class TemplateDefinition(TemplateConfig):
         Parses all files that belong to this template
         """
         schema: dict = schemas[TemplateDefinition.SCHEMA_NAME]
-        data: dict = utils.load_yaml_and_validate_handle_errors(path, schema.spec)
+        data: dict = utils.load_yaml_and_validate_handle_errors(
+            path, None, validator=schema.validator()
+        )
         template_files: dict[str, list[TemplateFile]] = {}
 
         for platform in data["spec"]["platforms"]:
@@ -160,8 +212,7 @@ class TemplateDefinition(TemplateConfig):
                         )
 
             else:
-                logger.error(f"{template_type}: Invalid platform type")
-                exit(1)
+                raise TemplateError(f"{template_type}: Invalid platform type")
 
         return TemplateDefinition(
             schema, data.get("metadata"), data["spec"], template_type, template_files
@@ -180,16 +231,106 @@ class TemplateFile:
         self.template_type = template_type
         self.platform = platform
         self.contents = contents
+        self.checksum = hashlib.sha256(contents.encode("utf8")).hexdigest()
+        # Python code of the template, if it was compiled ahead of time
+        self.code: Optional[CodeType] = None
+        self.compiled: Optional[jinja2.Template] = None
+        self.compiled_env: Optional[jinja2.Environment] = None
+        # names of the variables the template reads, see `used_variables`
+        self.variables: Optional[frozenset[str]] = None
+
+    def __getstate__(self) -> dict:
+        # compiled templates are bound to their environment and cannot be pickled
+        return self.__dict__ | {
+            "code": marshal.dumps(self.code) if self.code else None,
+            "compiled": None,
+            "compiled_env": None,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__ = state | {
+            "code": marshal.loads(state["code"]) if state["code"] else None
+        }
+
+    def compile(self, env: jinja2.Environment) -> jinja2.Template:
+        """
+        Compiles the template once per environment, using the environment's bytecode cache if there is one
+        """
+        if self.compiled is not None and self.compiled_env is env:
+            compile_stats.hit()
+            return self.compiled
+
+        code = self.code
+        bucket = None
+        if code is None and env.bytecode_cache is not None:
+            bucket = env.bytecode_cache.get_bucket(
+                env, self.checksum, None, self.contents
+            )
+            code = bucket.code
+
+        if code is None:
+            compile_stats.miss()
+            code = env.compile(self.contents, filename=self.path)
+            if bucket is not None:
+                bucket.code = code
+                env.bytecode_cache.set_bucket(bucket)
+        else:
+            compile_stats.hit()
+
+        self.compiled = env.template_class.from_code(env, code, env.make_globals(None))
+        self.compiled_env = env
+        return self.compiled
+
+    def used_variables(self) -> frozenset[str]:
+        """
+        Returns the names of the variables the template reads from the data, analyzing the template only once
+        """
+        if self.variables is None:
+            try:
+                ast = ANALYSIS_ENV.parse(self.contents)
+            except jinja2.exceptions.TemplateSyntaxError as err:
+                raise TemplateError(f"{self.path}: {err}") from err
+            self.variables = frozenset(jinja2.meta.find_undeclared_variables(ast))
+        return self.variables
+
+    def inputs(self, data: dict) -> dict:
+        """
+        Returns the part of the data the template reads, which is all that determines its output
+        """
+        return {x: data[x] for x in self.used_variables() if x in data}
 
-    def render(self, env: jinja2.Environment, data: dict) -> RenderedFile:
+    def fingerprint(self, data: dict) -> Optional[str]:
+        """
+        Returns a hash of the template and the data it reads, or None if the data cannot be hashed reliably
+        """
+        context = RenderCache.context_key(self.inputs(data))
+        if context is None:
+            return None
+        return RenderCache.key(self.checksum, context)
+
+    def render(
+        self,
+        env: jinja2.Environment,
+        data: dict,
+        cache: Optional[RenderCache] = None,
+    ) -> RenderedFile:
         """
-        Renders the template
+        Renders the template, or takes it from the cache if it was rendered with the same inputs before
         """
+        key = self.fingerprint(data) if cache is not None else None
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                render_stats.hit()
+                return RenderedFile(self, cached)
+            render_stats.miss()
+
         try:
-            rendered_text = env.from_string(self.contents).render(data)
+            rendered_text = self.compile(env).render(data)
         except jinja2.exceptions.TemplateError as err:
-            logger.error(f"{self.path}: {err}")
-            exit(1)
+            raise TemplateError(f"{self.path}: {err}") from err
+        if key is not None:
+            cache.set(key, rendered_text)
         return RenderedFile(self, rendered_text)
 
     @staticmethod
@@ -214,9 +355,9 @@ class RenderedFile:
         self.template = template
         self.contents = contents
 
-    def save(self, out_dir: str, name: str) -> str:
+    def filename(self, name: str) -> str:
         """
-        Writes the file to disk, returning the path to the file
+        Returns the name of the output file for the component `name`
         """
         suffix = (
             os.path.basename(self.template.path)
@@ -224,9 +365,12 @@ class RenderedFile:
             .replace(self.template.platform, "")
         )
 
-        target_path: str = os.path.join(out_dir, f"{name}{suffix}.tf")
-
-        with open(target_path, "w", encoding="utf8") as file:
-            file.write(self.contents)
+        return f"{name}{suffix}.tf"
 
-        return target_path
+    def save(self, sink: OutputSink, platform: str, name: str) -> tuple[str, str, dict]:
+        """
+        Writes the file of the component `name` to the sink, returning the file name, the status and the entry
+        """
+        filename = self.filename(name)
+        status, entry = sink.write(platform, filename, name, self.contents)
+        return filename, status, entry
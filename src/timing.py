@@ -0,0 +1,145 @@
+"""
+Contains the instrumentation that measures where the time of a transpilation is spent
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+# order of the phases in the report
+PHASES: list[str] = [
+    "schemaLoad",
+    "architectureLoad",
+    "templateLoad",
+    "validate",
+    "render",
+    "write",
+]
+
+
+class Span:
+    """
+    A measured piece of work, usable as a context manager
+    """
+
+    def __init__(self, name: str, category: str, args: Optional[dict] = None) -> None:
+        self.name = name
+        self.category = category
+        self.args = args or {}
+        self.pid = os.getpid()
+        self.tid = threading.get_native_id()
+        self.start = 0.0
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def __enter__(self) -> Span:
+        self.start = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.wall = time.perf_counter() - self.start
+        self.cpu = time.thread_time() - self.cpu
+
+    def trace_event(self, origin: float) -> dict:
+        """
+        Returns the span as a complete event of the Chrome trace event format
+        """
+        return {
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": (self.start - origin) * 1e6,
+            "dur": self.wall * 1e6,
+            "pid": self.pid,
+            "tid": self.tid,
+            "args": self.args,
+        }
+
+
+class Profiler:
+    """
+    Collects the spans of the phases and of every rendered and written file
+    """
+
+    def __init__(self) -> None:
+        # perf_counter is system wide on Linux, so spans of worker processes line up
+        self.origin = time.perf_counter()
+        self.cpu_origin = time.process_time()
+        self.spans: list[Span] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[Span]:
+        """
+        Measures a phase of the transpilation
+        """
+        with Span(name, "phase") as span:
+            yield span
+        self.spans.append(span)
+
+    def add(self, span: Span) -> None:
+        """
+        Adds a span that was measured elsewhere, e.g. in a worker process
+        """
+        self.spans.append(span)
+
+    def stats(self, slowest: int) -> dict:
+        """
+        Returns the wall and CPU time of every phase as well as the slowest templates and components
+
+        The render and write times are summed over all files, so they exceed the wall time when
+        rendering in parallel.
+        """
+        timings: dict[str, dict[str, float]] = {}
+        templates: dict[str, float] = defaultdict(float)
+        components: dict[str, float] = defaultdict(float)
+        for span in self.spans:
+            phase = span.name if span.category == "phase" else span.category
+            timing = timings.setdefault(phase, {"wall": 0.0, "cpu": 0.0})
+            timing["wall"] += span.wall
+            timing["cpu"] += span.cpu
+            if span.category == "render":
+                templates[span.args["template"]] += span.wall
+                components[span.args["component"]] += span.wall
+
+        ordered = {x: timings[x] for x in PHASES if x in timings}
+        ordered["total"] = {
+            "wall": time.perf_counter() - self.origin,
+            "cpu": time.process_time() - self.cpu_origin,
+        }
+
+        return {
+            "timings": {
+                phase: {kind: round(seconds, 6) for kind, seconds in timing.items()}
+                for phase, timing in ordered.items()
+            },
+            "slowestTemplates": Profiler.slowest(templates, "template", slowest),
+            "slowestComponents": Profiler.slowest(components, "component", slowest),
+        }
+
+    @staticmethod
+    def slowest(seconds: dict[str, float], key: str, count: int) -> list[dict]:
+        """
+        Returns the `count` entries that took the most time
+        """
+        ordered = sorted(seconds.items(), key=lambda x: x[1], reverse=True)
+        return [{key: name, "seconds": round(x, 6)} for name, x in ordered[:count]]
+
+    def save_trace(self, path: str) -> None:
+        """
+        Writes all spans as a Chrome trace event file
+        """
+        with open(path, "w", encoding="utf8") as file:
+            json.dump(
+                {
+                    "traceEvents": [x.trace_event(self.origin) for x in self.spans],
+                    "displayTimeUnit": "ms",
+                },
+                file,
+            )
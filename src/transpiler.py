@@ -2,21 +2,49 @@
 Transpiles templates to terraform files
 """
 
+import copy
 import os
+from collections import Counter
+from contextlib import nullcontext
+from typing import Iterator, Optional
 
 import jinja2
-import yaml
 from loguru import logger
 
 from . import utils
 from .architecture import ArchitectureConfig
-from .common import init
+from .bundle import is_bundle, load_bundle, write_bundle
+from .cache import RENDER_CACHE_SIZE, RenderCache
+from .common import check_architecture, create_environment, load_architecture
+from .errors import (
+    ArchitectureError,
+    BatchError,
+    MultiformError,
+    UsageError,
+    log_error,
+)
+from .manifest import CREATED, UPDATED
+from .overlay import OverlayConfig
+from .report import ReportWriter
 from .schema import Schema, SchemaRegistry
-from .tags import report_dumper
-from .template import TemplateDefinition, TemplateRoot
+from .sink import OutputSink, PlanSink, create_sink, sink_format
+from .template import (
+    TemplateDefinition,
+    TemplateFile,
+    TemplateRoot,
+    compile_stats,
+    render_stats,
+)
+from .timing import Profiler, Span
 
 TEMPLATE_ROOT_FILE: str = "root.yaml"
 TEMPLATE_DEFINITION_FILE: str = "definition.yaml"
+# templates that are rendered once per platform instead of once per component
+SPECIAL_TEMPLATES: list[str] = ["main", "versions"]
+# variables that component templates get in addition to the metadata and properties
+COMPONENT_VARIABLES: list[str] = ["resourceId", "resourceType"]
+# architectures with fewer components are validated in a single process, as starting workers takes longer
+PARALLEL_VALIDATION_MIN: int = 1000
 
 
 def read_template_dir(
@@ -33,47 +61,272 @@ def read_template_dir(
     return TemplateDefinition.from_schemas(template_dir, template_type, file, schemas)
 
 
-def transpile(
-    input_file: str, template_dir: str, out_dir: str, report: bool, debug: bool
+class RenderJob:
+    """
+    A single output of the transpilation: a template definition rendered for one platform
+    """
+
+    def __init__(
+        self, platform: str, name: str, template_type: str, data: dict
+    ) -> None:
+        self.platform = platform
+        self.name = name
+        self.template_type = template_type
+        self.data = data
+
+    def args(self, template: TemplateFile) -> dict:
+        """
+        Returns the arguments of the spans of a template file
+        """
+        return {
+            "template": template.path,
+            "component": self.name,
+            "platform": self.platform,
+        }
+
+    def key(self, templates: dict[str, TemplateDefinition]) -> Optional[tuple]:
+        """
+        Returns a key that is equal for jobs rendering the same files, based on the data each template reads,
+        or None if the data cannot be hashed reliably
+        """
+        fingerprints = tuple(
+            x.fingerprint(self.data)
+            for x in templates[self.template_type].files(self.platform)
+        )
+        if None in fingerprints:
+            return None
+        return self.platform, self.name, self.template_type, fingerprints
+
+    def run(
+        self,
+        templates: dict[str, TemplateDefinition],
+        env: jinja2.Environment,
+        sink: OutputSink,
+        cache: Optional[RenderCache] = None,
+    ) -> list[tuple[str, str, dict, list[Span]]]:
+        """
+        Renders and saves the files of the job, returning their names, statuses, entries
+        and the spans measuring the rendering and writing of each file
+        """
+        results: list[tuple[str, str, dict, list[Span]]] = []
+        for template in templates[self.template_type].files(self.platform):
+            args = self.args(template)
+            with Span(f"{self.name}: {template.path}", "render", args) as rendering:
+                file = template.render(env, self.data, cache)
+            with Span(f"{self.name}: {template.path}", "write", args) as writing:
+                name, status, entry = file.save(sink, self.platform, self.name)
+            results.append((name, status, entry, [rendering, writing]))
+        return results
+
+    def render(
+        self,
+        templates: dict[str, TemplateDefinition],
+        env: jinja2.Environment,
+        cache: Optional[RenderCache] = None,
+    ) -> list[tuple[str, str, Span]]:
+        """
+        Renders the files of the job without saving them, returning their names, contents
+        and the spans measuring the rendering of each file
+        """
+        rendered: list[tuple[str, str, Span]] = []
+        for template in templates[self.template_type].files(self.platform):
+            with Span(
+                f"{self.name}: {template.path}", "render", self.args(template)
+            ) as rendering:
+                file = template.render(env, self.data, cache)
+            rendered.append((file.filename(self.name), file.contents, rendering))
+        return rendered
+
+    def save(
+        self, rendered: list[tuple[str, str, Span]], sink: OutputSink
+    ) -> list[tuple[str, str, dict, list[Span]]]:
+        """
+        Saves the files returned by `render`, returning the same results as `run`
+        """
+        results: list[tuple[str, str, dict, list[Span]]] = []
+        for name, contents, rendering in rendered:
+            with Span(rendering.name, "write", rendering.args) as writing:
+                status, entry = sink.write(self.platform, name, self.name, contents)
+            results.append((name, status, entry, [rendering, writing]))
+        return results
+
+
+# templates, templating engine, output sink and render cache of a render worker process, see `init_render_worker`
+worker_state: dict = {}
+
+
+def init_render_worker(
+    templates: dict[str, TemplateDefinition],
+    template_cache: Optional[str],
+    sink: Optional[OutputSink],
+    render_cache: Optional[RenderCache],
 ) -> None:
     """
-    Transpiles the files
+    Sets up a render worker process once, so that every job can reuse the compiled templates
+
+    Without a sink, the workers only render the files and the parent process saves them.
+    """
+    worker_state["templates"] = templates
+    worker_state["env"] = create_environment(template_cache)
+    worker_state["sink"] = sink
+    worker_state["cache"] = render_cache
+
+
+def run_render_job(
+    job: RenderJob,
+) -> tuple[list[tuple], dict, dict]:
+    """
+    Runs a job inside a render worker process, returning its results and the template and render cache counters
     """
-    mappings: list = []
-    stats: dict = {"outputFiles": 0}
+    compiled, cached = compile_stats.as_dict(), render_stats.as_dict()
+    if worker_state["sink"] is None:
+        results = job.render(
+            worker_state["templates"], worker_state["env"], worker_state["cache"]
+        )
+    else:
+        results = job.run(
+            worker_state["templates"],
+            worker_state["env"],
+            worker_state["sink"],
+            worker_state["cache"],
+        )
+    return results, compile_stats.since(compiled), render_stats.since(cached)
 
-    jinja: jinja2.Environment
-    schema_registry: SchemaRegistry
-    architecture: ArchitectureConfig
-    jinja, schema_registry, architecture = init(input_file)
 
-    root: TemplateRoot = TemplateRoot.with_schema_registry(
-        os.path.join(template_dir, TEMPLATE_ROOT_FILE), schema_registry
+def run_jobs(
+    jobs: list[RenderJob],
+    templates: dict[str, TemplateDefinition],
+    env: jinja2.Environment,
+    template_cache: Optional[str],
+    sink: Optional[OutputSink],
+    workers: int,
+    render_cache: Optional[RenderCache] = None,
+) -> Iterator[list[tuple]]:
+    """
+    Renders the jobs and saves them to the sink, yielding the results of each job in the order of `jobs`
+
+    Without a sink, the files are only rendered and the results of `RenderJob.render` are yielded.
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            if sink is None:
+                yield job.render(templates, env, render_cache)
+            else:
+                yield job.run(templates, env, sink, render_cache)
+        return
+
+    # multiprocessing is slow to import and only needed for parallel runs
+    from concurrent.futures import ProcessPoolExecutor
+
+    logger.info(f"Rendering {len(jobs)} jobs with {workers} workers...")
+    parallel = sink is not None and sink.parallel
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_render_worker,
+        initargs=(
+            templates,
+            template_cache,
+            sink if parallel else None,
+            render_cache,
+        ),
+    ) as executor:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        for job, (results, compiled, cached) in zip(
+            jobs, executor.map(run_render_job, jobs, chunksize=chunksize)
+        ):
+            compile_stats.add(compiled)
+            render_stats.add(cached)
+            yield results if parallel or sink is None else job.save(results, sink)
+
+
+def render_jobs(
+    jobs: list[RenderJob],
+    templates: dict[str, TemplateDefinition],
+    env: jinja2.Environment,
+    template_cache: Optional[str],
+    sink: OutputSink,
+    workers: int,
+    render_cache: Optional[RenderCache] = None,
+    memo: Optional[dict] = None,
+) -> Iterator[list[tuple[str, str, dict, list[Span]]]]:
+    """
+    Renders and saves all jobs, yielding the results of each job in the order of `jobs`
+
+    With a `memo`, the jobs that were rendered with the same data before, e.g. for another variant,
+    are saved from the memo instead of rendering them again, and all rendered jobs are added to it.
+    """
+    if memo is None:
+        yield from run_jobs(
+            jobs, templates, env, template_cache, sink, workers, render_cache
+        )
+        return
+
+    keys = [job.key(templates) for job in jobs]
+    # decided up front, so that every job that is rendered takes exactly one result
+    memoized = [key in memo for key in keys]
+    missing = [job for job, hit in zip(jobs, memoized) if not hit]
+    if len(missing) < len(jobs):
+        logger.info(
+            f"Reusing {len(jobs) - len(missing)} of {len(jobs)} jobs rendered for other variants"
+        )
+
+    rendered = run_jobs(
+        missing, templates, env, template_cache, None, workers, render_cache
     )
+    for job, key, hit in zip(jobs, keys, memoized):
+        if hit:
+            # only the writing of memoized files is measured again
+            yield [
+                (name, status, entry, spans[1:])
+                for name, status, entry, spans in job.save(memo[key], sink)
+            ]
+            continue
+        files = next(rendered, None)
+        if files is None:
+            raise RuntimeError(f"No files were rendered for job '{job.name}'")
+        if key is not None:
+            memo[key] = files
+        yield job.save(files, sink)
 
-    platforms: list[dict] = architecture.platforms()
-    platform_names: list[str] = list(map(lambda x: x["name"], platforms))
-    template_data: dict = {
-        **architecture.metadata,
-    }
 
-    # create & clear output directories
-    logger.info("Perparing output directories...")
-    for platform in platform_names:
-        folder = os.path.join(out_dir, platform)
-        os.makedirs(folder, exist_ok=True)
-        # delete all files in folders
-        for path in os.listdir(folder):
-            file = os.path.join(folder, path)
-            if os.path.isfile(file) and path not in [
-                ".terraform.lock.hcl",
-                "terraform.tfstate",
-                ".terraform.tfstate.lock.info",
-                "terraform.tfstate.backup",
-            ]:
-                os.remove(file)
-
-    # read templates
+def select_components(
+    architecture: ArchitectureConfig,
+    only: Optional[list[str]],
+    types: Optional[list[str]],
+) -> list[dict]:
+    """
+    Selects the components to transpile, including the components they reference
+    """
+    names: set[str] = {x["name"] for x in architecture.components()}
+    unknown: list[str] = [x for x in only or [] if x not in names]
+    if len(unknown) >= 1:
+        raise UsageError(f"Unknown components selected: {unknown}")
+
+    components: list[dict] = architecture.select(only, types)
+    if only or types:
+        logger.info(
+            f"Selected {len(components)} of {len(architecture.components())} components"
+        )
+    return components
+
+
+def select_platforms(platforms: list[dict], names: list[str]) -> list[dict]:
+    """
+    Selects the platforms to transpile for
+    """
+    unknown: list[str] = [x for x in names if x not in [y["name"] for y in platforms]]
+    if len(unknown) >= 1:
+        raise UsageError(f"Unknown platforms selected: {unknown}")
+
+    return [x for x in platforms if x["name"] in names]
+
+
+def read_templates(
+    template_dir: str, root: TemplateRoot, schema_registry: SchemaRegistry
+) -> tuple[dict[str, TemplateDefinition], dict[str, TemplateDefinition]]:
+    """
+    Reads all templates listed in the template root, returning the component templates and the special templates
+    """
     logger.info("Reading templates...")
     template_registry: dict[str, TemplateDefinition] = {}
     for template in root["templates"]:
@@ -81,105 +334,678 @@ def transpile(
         template_registry[template_name] = read_template_dir(
             template_dir, template_name, template, schema_registry
         )
+    special_registry: dict[str, TemplateDefinition] = {
+        special: read_template_dir(
+            template_dir, special, root[special], schema_registry
+        )
+        for special in SPECIAL_TEMPLATES
+    }
+    return template_registry, special_registry
 
-    # write out templated files
-    logger.info("Generating output files...")
-    for platform_struct in platforms:
-        platform_name = platform_struct["name"]
-        platform_properties = platform_struct["properties"]
 
-        component_data = template_data | platform_properties
+def load_templates(
+    template_dir: str, schema_registry: SchemaRegistry
+) -> tuple[TemplateRoot, dict[str, TemplateDefinition], dict[str, TemplateDefinition]]:
+    """
+    Loads the templates from a template directory or a compiled template bundle
+    """
+    if is_bundle(template_dir):
+        return load_bundle(template_dir)
+
+    root: TemplateRoot = TemplateRoot.with_schema_registry(
+        os.path.join(template_dir, TEMPLATE_ROOT_FILE), schema_registry
+    )
+    template_registry, special_registry = read_templates(
+        template_dir, root, schema_registry
+    )
+    return root, template_registry, special_registry
+
+
+def compile_templates(template_dir: str, out_file: str) -> None:
+    """
+    Validates the templates of a template directory and compiles them into a bundle
+    """
+    logger.info("Reading and validating schemas...")
+    schema_registry: SchemaRegistry = Schema.load_all()
+    root, template_registry, special_registry = load_templates(
+        template_dir, schema_registry
+    )
+    write_bundle(out_file, root, template_registry, special_registry)
+    logger.success(
+        f"Compiled {len(template_registry) + len(special_registry)} templates into {out_file}"
+    )
+
+
+# template definitions and component index of a validation worker process, see `init_validate_worker`
+validate_state: dict = {}
+
+
+def init_validate_worker(
+    template_registry: dict[str, TemplateDefinition], components: dict[str, dict]
+) -> None:
+    """
+    Sets up a validation worker process once, so that every job can reuse the validators
+    """
+    validate_state["templates"] = template_registry
+    validate_state["components"] = components
+
+
+def run_validate_job(components: list[dict]) -> dict[str, str]:
+    """
+    Validates components of the same type inside a validation worker process
+    """
+    return validate_group(
+        components, validate_state["templates"], validate_state["components"]
+    )
+
+
+def validate_group(
+    components: list[dict],
+    template_registry: dict[str, TemplateDefinition],
+    index: dict[str, dict],
+) -> dict[str, str]:
+    """
+    Validates the properties of components of the same type with the validator of their template,
+    returning the problem of every invalid component by name
+    """
+    template: TemplateDefinition = template_registry[components[0]["type"]]
+    problems: dict[str, str] = {}
+    for component in components:
+        problem = template.validate_properties(component.get("properties") or {}, index)
+        if problem is not None:
+            problems[component["name"]] = problem
+    return problems
 
-        folder = os.path.join(out_dir, platform_name)
-        os.makedirs(folder, exist_ok=True)
-
-        for special in ["main", "versions"]:
-            files = read_template_dir(
-                template_dir, special, root[special], schema_registry
-            ).render(platform_name, jinja, component_data)
-            for file in files:
-                path = file.save(folder, special)
-                mappings.append(
-                    {
-                        "platform": platform_name,
-                        "component": special,
-                        "path": path,
-                        "properties": component_data,
-                    }
-                )
-                stats["outputFiles"] = stats["outputFiles"] + 1
 
-    for component in architecture.components():
+def validate_components(
+    architecture: ArchitectureConfig,
+    components: list[dict],
+    template_registry: dict[str, TemplateDefinition],
+    workers: int = 1,
+    validated: Optional[dict[int, dict]] = None,
+) -> None:
+    """
+    Validates the properties of the components before anything is rendered, raising an ArchitectureError
+    with the problems of all invalid components
+
+    Components are validated grouped by type, so that every template reuses its validator, and in
+    `workers` processes for large architectures. Components whose id is in `validated` are not validated
+    again, and all valid components are added to it by id, which skips components that variants
+    share with each other.
+    """
+    pending: list[dict] = [
+        x for x in components if validated is None or id(x) not in validated
+    ]
+
+    problems: dict[str, str] = {}
+    groups: dict[str, list[dict]] = {}
+    for component in pending:
         if component["type"] not in template_registry:
-            logger.error(f"Unknown component type '{component['type']}'")
-            exit(1)
+            problems[component["name"]] = (
+                f"Component '{component['name']}' has the unknown type '{component['type']}'"
+            )
+        else:
+            groups.setdefault(component["type"], []).append(component)
 
-        template: TemplateDefinition = template_registry[component["type"]]
-        component_name = component["name"]
-        component_properties = component.get("properties")
+    results: list[dict[str, str]] = []
+    if workers <= 1 or len(pending) < PARALLEL_VALIDATION_MIN:
+        for group in groups.values():
+            results.append(validate_group(group, template_registry, architecture.index))
+    else:
+        # multiprocessing is slow to import and only needed for parallel runs
+        from concurrent.futures import ProcessPoolExecutor
 
-        # validate that all required component properties are set
-        if not template.validate_properties(
-            component_properties, architecture.components()
-        ):
-            logger.error(f"Invalid properties for component '{component_name}'")
-            exit(1)
+        size = max(1, len(pending) // (workers * 4))
+        chunks: list[list[dict]] = [
+            group[i : i + size]
+            for group in groups.values()
+            for i in range(0, len(group), size)
+        ]
+        logger.info(f"Validating {len(pending)} components with {workers} workers...")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_validate_worker,
+            initargs=(
+                {x: template_registry[x] for x in groups},
+                # references are only checked for the type of the referenced component
+                {name: {"type": x["type"]} for name, x in architecture.index.items()},
+            ),
+        ) as executor:
+            results += executor.map(run_validate_job, chunks)
+
+    for result in results:
+        problems |= {
+            name: f"Invalid properties for component '{name}': {problem}"
+            for name, problem in result.items()
+        }
 
-        component_data = (
-            template_data
-            | platform_properties
-            | component_properties
-            | {
-                "resourceId": component_name,
-                "resourceType": component["type"],
-            }
+    if len(problems) >= 1:
+        raise ArchitectureError(
+            f"Found {len(problems)} invalid components",
+            [problems[x["name"]] for x in pending if x["name"] in problems],
         )
+    if validated is not None:
+        # the components are kept alive, so their ids are not reused by other objects
+        validated.update((id(x), x) for x in pending)
+
+
+def collect_jobs(
+    architecture: ArchitectureConfig,
+    platforms: list[dict],
+    components: list[dict],
+    specials: bool = True,
+) -> list[RenderJob]:
+    """
+    Collects the outputs to render for components validated with `validate_components`, in the order they appear in the report
+    """
+    template_data: dict = {
+        **architecture.metadata,
+    }
+
+    jobs: list[RenderJob] = []
+    for platform_struct in platforms if specials else []:
+        platform_name = platform_struct["name"]
+        platform_properties = platform_struct.get("properties") or {}
+
+        component_data = template_data | platform_properties
+
+        for special in SPECIAL_TEMPLATES:
+            jobs.append(RenderJob(platform_name, special, special, component_data))
+
+    for component in components:
+        component_name = component["name"]
+        component_properties = component.get("properties") or {}
 
         for platform_struct in platforms:
             platform_name = platform_struct["name"]
-            platform_properties = platform_struct["properties"]
-
-            folder = os.path.join(out_dir, platform_name)
-            files = template.render(platform_name, jinja, component_data)
-            for file in files:
-                path = file.save(folder, component["name"])
-
-                mappings.append(
-                    {
-                        "platform": platform_name,
-                        "component": component["name"],
-                        "path": path,
-                        "properties": component_data,
-                    }
+            platform_properties = platform_struct.get("properties") or {}
+
+            component_data = (
+                template_data
+                | platform_properties
+                | component_properties
+                | {
+                    "resourceId": component_name,
+                    "resourceType": component["type"],
+                }
+            )
+
+            jobs.append(
+                RenderJob(
+                    platform_name,
+                    component_name,
+                    component["type"],
+                    component_data,
                 )
-                stats["outputFiles"] = stats["outputFiles"] + 1
-
-    if report:
-        if not debug:
-            logger.info("Prettifying report...")
-            platform_mappings = {}
-            for mapping in mappings:
-                del mapping["properties"]
-                plat = mapping["platform"]
-
-                del mapping["platform"]
-                if plat in platform_mappings:
-                    platform_mappings[plat].append(mapping)
-                else:
-                    platform_mappings[plat] = [mapping]
-
-            mappings = platform_mappings
-
-        logger.info("Saving report...")
-        with open("out/report.yaml", "w", encoding="utf8") as file:
-            file.write(
-                yaml.dump(
-                    {
-                        "metadata": architecture.metadata,
-                        "stats": stats,
-                        "platforms": platform_names,
-                        "mappings": mappings,
-                    },
-                    Dumper=report_dumper(),
+            )
+
+    return jobs
+
+
+def write_outputs(
+    jobs: list[RenderJob],
+    templates: dict[str, TemplateDefinition],
+    env: jinja2.Environment,
+    template_cache: Optional[str],
+    sink: OutputSink,
+    workers: int = 1,
+    keep: Optional[set[str]] = None,
+    profiler: Optional[Profiler] = None,
+    report: Optional[ReportWriter] = None,
+    render_cache: Optional[RenderCache] = None,
+    memo: Optional[dict] = None,
+) -> dict:
+    """
+    Renders the jobs into the sink and finishes it, e.g. pruning the stale files of the output
+    directories, returning the stats for the report
+
+    The files of the components (or special templates) in `keep` are neither rendered nor pruned.
+    Every written file is added to the `report` right away. Files are taken from the `render_cache`
+    if they were rendered with the same template and data before, and jobs from the `memo`,
+    see `render_jobs`.
+    """
+    stats: dict = {"outputFiles": 0, "bytesWritten": 0}
+
+    # write out templated files
+    logger.info("Generating output files...")
+    for job, results in zip(
+        jobs,
+        render_jobs(
+            jobs, templates, env, template_cache, sink, workers, render_cache, memo
+        ),
+    ):
+        for name, status, entry, spans in results:
+            sink.record(job.platform, name, status, entry)
+            if status in [CREATED, UPDATED]:
+                stats["bytesWritten"] += entry["size"]
+            for span in spans if profiler else []:
+                profiler.add(span)
+            if report:
+                report.mapping(
+                    job.platform,
+                    job.name,
+                    sink.path(job.platform, name),
+                    job.data,
                 )
+            stats["outputFiles"] = stats["outputFiles"] + 1
+
+    # complete the output, e.g. remove the outputs of components that no longer exist
+    changes: Counter = Counter()
+    # waiting for the writer, syncing, pruning and saving the manifests is part of writing
+    with Span("finish output", "write") as finishing:
+        summaries = sink.finish(keep)
+    if profiler:
+        profiler.add(finishing)
+    for platform, summary in summaries.items():
+        changes.update(summary)
+        logger.info(
+            f"{platform}: "
+            + ", ".join(f"{count} {status}" for status, count in summary.items())
+        )
+    stats["files"] = dict(changes)
+
+    return stats
+
+
+class TranspileOptions:
+    """
+    The options of a transpilation that apply to every architecture
+    """
+
+    def __init__(
+        self,
+        report: bool = False,
+        debug: bool = False,
+        template_cache: Optional[str] = None,
+        workers: int = 1,
+        only: Optional[list[str]] = None,
+        types: Optional[list[str]] = None,
+        selected_platforms: Optional[list[str]] = None,
+        slowest: int = 10,
+        architecture_cache: Optional[str] = None,
+        report_file: Optional[str] = None,
+        report_format: str = "yaml",
+        output_format: Optional[str] = None,
+        fsync: bool = False,
+        render_cache: Optional[str] = None,
+        render_cache_size: Optional[int] = None,
+        plan: bool = False,
+        diff: bool = False,
+    ) -> None:
+        self.report = report or report_file is not None
+        self.debug = debug
+        self.template_cache = template_cache
+        self.workers = workers
+        self.only = only
+        self.types = types
+        self.selected_platforms = selected_platforms
+        self.slowest = slowest
+        self.architecture_cache = architecture_cache
+        self.report_file = report_file
+        self.report_format = report_format
+        self.output_format = output_format
+        self.fsync = fsync
+        self.render_cache = render_cache
+        # in megabytes
+        self.render_cache_size = (
+            RENDER_CACHE_SIZE if render_cache_size is None else render_cache_size
+        )
+        # compare with the output directory instead of writing to it, see `PlanSink`
+        self.plan = plan
+        self.diff = diff
+
+
+class TemplateLibrary:
+    """
+    The schemas and templates that are loaded once and shared by all architectures of a transpilation
+    """
+
+    def __init__(
+        self,
+        schema_registry: SchemaRegistry,
+        template_registry: dict[str, TemplateDefinition],
+        special_registry: dict[str, TemplateDefinition],
+    ) -> None:
+        self.schema_registry = schema_registry
+        self.template_registry = template_registry
+        self.special_registry = special_registry
+
+    def templates(self) -> dict[str, TemplateDefinition]:
+        """
+        Returns the component and the special templates
+        """
+        return self.template_registry | self.special_registry
+
+
+def find_architectures(paths: list[str]) -> list[str]:
+    """
+    Returns the architecture files, replacing folders by the YAML files they contain
+    """
+    files: list[str] = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+
+        found = sorted(
+            os.path.join(path, x)
+            for x in os.listdir(path)
+            if x.endswith((".yaml", ".yml")) and os.path.isfile(os.path.join(path, x))
+        )
+        if not found:
+            raise UsageError(f"No architecture files found in '{path}'")
+        files.extend(found)
+    return files
+
+
+def batch_out_dirs(input_files: list[str], out_dir: str) -> dict[str, str]:
+    """
+    Returns the output root of every architecture of a batch, a folder named after the file
+    """
+    out_dirs: dict[str, str] = {}
+    for input_file in input_files:
+        name = os.path.splitext(os.path.basename(input_file))[0]
+        folder = os.path.join(out_dir, name)
+        if folder in out_dirs.values():
+            raise UsageError(
+                f"Multiple architectures would be written to '{folder}', rename '{input_file}'"
+            )
+        out_dirs[input_file] = folder
+    return out_dirs
+
+
+def transpile_architecture(
+    input_file: str,
+    out_dir: str,
+    library: TemplateLibrary,
+    env: jinja2.Environment,
+    options: TranspileOptions,
+    profiler: Profiler,
+) -> dict:
+    """
+    Transpiles a single architecture against an already loaded template library, returning the stats
+    """
+    with profiler.phase("architectureLoad"):
+        architecture: ArchitectureConfig = load_architecture(
+            input_file,
+            library.schema_registry,
+            options.architecture_cache,
+            options.workers,
+        )
+
+    return transpile_config(architecture, out_dir, library, env, options, profiler)
+
+
+def transpile_variants(
+    input_file: str,
+    overlays: list[str],
+    out_dir: str,
+    library: TemplateLibrary,
+    env: jinja2.Environment,
+    options: TranspileOptions,
+    profiler: Profiler,
+) -> None:
+    """
+    Transpiles a variant of the architecture for every overlay into its own output root below `out_dir`
+
+    The architecture is only loaded once, components that the variants share are only validated once
+    and jobs that render the same data in several variants are only rendered once. All variants are
+    validated before the first one is written.
+    """
+    with profiler.phase("architectureLoad"):
+        architecture: ArchitectureConfig = load_architecture(
+            input_file,
+            library.schema_registry,
+            options.architecture_cache,
+            options.workers,
+        )
+        variants: list[OverlayConfig] = [
+            OverlayConfig.with_schema_registry(x, library.schema_registry)
+            for x in overlays
+        ]
+
+    names: list[str] = [x.name for x in variants]
+    duplicates: list[str] = sorted({x for x in names if names.count(x) > 1})
+    if len(duplicates) >= 1:
+        raise UsageError(f"Several overlays are named {duplicates}")
+
+    # all variants are validated before any is written, so an invalid variant leaves no partial outputs
+    validated: dict[int, dict] = {}
+    configs: list[ArchitectureConfig] = []
+    with profiler.phase("validate"):
+        for overlay in variants:
+            logger.info(f"Validating variant {overlay.name}...")
+            variant = overlay.apply(architecture)
+            check_architecture(variant)
+            validate_components(
+                variant,
+                select_components(variant, options.only, options.types),
+                library.template_registry,
+                options.workers,
+                validated,
             )
+            configs.append(variant)
+
+    memo: dict = {}
+    for overlay, variant in zip(variants, configs):
+        logger.info(f"Transpiling variant {overlay.name}...")
+        transpile_config(
+            variant,
+            os.path.join(out_dir, overlay.name),
+            library,
+            env,
+            options,
+            profiler,
+            memo,
+            validated,
+        )
+        # every variant gets its own timings, the first one includes loading and validating
+        profiler = Profiler()
+    logger.success(f"Transpiled {len(variants)} variants")
+
+
+def transpile_config(
+    architecture: ArchitectureConfig,
+    out_dir: str,
+    library: TemplateLibrary,
+    env: jinja2.Environment,
+    options: TranspileOptions,
+    profiler: Profiler,
+    memo: Optional[dict] = None,
+    validated: Optional[dict[int, dict]] = None,
+) -> dict:
+    """
+    Transpiles a loaded architecture, returning the stats
+
+    With `options.plan`, nothing is written and the stats contain the changes to the output directory.
+    `memo` and `validated` are shared by the variants of an architecture, see `transpile_variants`.
+    """
+    cache_before = compile_stats.as_dict()
+    render_before = render_stats.as_dict()
+    render_cache: Optional[RenderCache] = None
+    if options.render_cache:
+        render_cache = RenderCache(
+            options.render_cache, options.render_cache_size * 1024 * 1024
+        )
+
+    platforms: list[dict] = architecture.platforms()
+    components: list[dict] = select_components(
+        architecture, options.only, options.types
+    )
+    if options.selected_platforms:
+        platforms = select_platforms(platforms, options.selected_platforms)
+    platform_names: list[str] = list(map(lambda x: x["name"], platforms))
+
+    with profiler.phase("validate"):
+        validate_components(
+            architecture,
+            components,
+            library.template_registry,
+            options.workers,
+            validated,
+        )
+        jobs: list[RenderJob] = collect_jobs(architecture, platforms, components)
+
+    keep: Optional[set[str]] = None
+    if len(components) < len(architecture.components()):
+        keep = set(architecture.index) - {x["name"] for x in components}
+
+    writer: Optional[ReportWriter] = None
+    if options.report:
+        # reports of archives are written next to them
+        report_dir = out_dir
+        if sink_format(out_dir, options.output_format) != "directory":
+            report_dir = os.path.dirname(out_dir)
+        writer = ReportWriter(
+            options.report_file
+            or ReportWriter.default_path(report_dir, options.report_format),
+            options.report_format,
+            options.debug,
+        )
+
+    with writer or nullcontext():
+        if writer:
+            writer.metadata(architecture.metadata, platform_names)
+
+        sink: OutputSink = (
+            PlanSink(out_dir, platform_names, options.diff)
+            if options.plan
+            else create_sink(
+                out_dir, platform_names, options.output_format, options.fsync
+            )
+        )
+        with sink:
+            stats = write_outputs(
+                jobs,
+                library.templates(),
+                env,
+                options.template_cache,
+                sink,
+                options.workers,
+                keep,
+                profiler,
+                writer,
+                render_cache,
+                memo,
+            )
+        if options.plan:
+            stats["plan"] = sink.plan
+
+        # the counters are global, so only report what this architecture added
+        stats["templateCache"] = compile_stats.since(cache_before)
+        logger.info(
+            f"Template cache: {stats['templateCache']['hits']} hits, {stats['templateCache']['misses']} misses"
+        )
+        if render_cache:
+            stats["renderCache"] = render_stats.since(render_before)
+            logger.info(
+                f"Render cache: {stats['renderCache']['hits']} hits, {stats['renderCache']['misses']} misses"
+            )
+
+        stats |= profiler.stats(options.slowest)
+        logger.info(
+            "Timings: "
+            + ", ".join(
+                f"{phase} {timing['wall'] * 1000:.0f} ms"
+                for phase, timing in stats["timings"].items()
+            )
+        )
+
+        if writer:
+            writer.stats(stats)
+
+    return stats
+
+
+# state of a batch worker process, set up once by `init_batch_worker`
+batch_state: dict = {}
+
+
+def init_batch_worker(library: TemplateLibrary, options: TranspileOptions) -> None:
+    """
+    Sets up a batch worker process once, so that all its architectures share the compiled templates
+    """
+    batch_state["library"] = library
+    batch_state["env"] = create_environment(options.template_cache)
+    batch_state["options"] = options
+
+
+def run_batch_job(architecture: tuple[str, str]) -> bool:
+    """
+    Transpiles an architecture inside a batch worker process, returning whether it succeeded
+    """
+    input_file, out_dir = architecture
+    return transpile_batch_entry(
+        input_file,
+        out_dir,
+        batch_state["library"],
+        batch_state["env"],
+        batch_state["options"],
+    )
+
+
+def transpile_batch_entry(
+    input_file: str,
+    out_dir: str,
+    library: TemplateLibrary,
+    env: jinja2.Environment,
+    options: TranspileOptions,
+) -> bool:
+    """
+    Transpiles an architecture of a batch, returning whether it succeeded
+    """
+    logger.info(f"Transpiling {input_file} to {out_dir}...")
+    try:
+        transpile_architecture(input_file, out_dir, library, env, options, Profiler())
+    except MultiformError as err:
+        # continue with the other architectures
+        log_error(err)
+        logger.error(f"Transpiling {input_file} failed")
+        return False
+    return True
+
+
+def transpile_batch(
+    input_files: list[str],
+    out_dir: str,
+    library: TemplateLibrary,
+    env: jinja2.Environment,
+    options: TranspileOptions,
+) -> None:
+    """
+    Transpiles several architectures into their own output roots below `out_dir`
+
+    With more than one worker, the architectures are transpiled in parallel instead of
+    rendering the files of each architecture in parallel.
+    """
+    out_dirs = batch_out_dirs(input_files, out_dir)
+    workers = min(options.workers, len(input_files))
+    # every architecture is rendered serially, without changing the options of the caller
+    options = copy.copy(options)
+    options.workers = 1
+
+    if workers <= 1:
+        results = [
+            transpile_batch_entry(input_file, folder, library, env, options)
+            for input_file, folder in out_dirs.items()
+        ]
+    else:
+        # multiprocessing is slow to import and only needed for parallel runs
+        from concurrent.futures import ProcessPoolExecutor
+
+        logger.info(
+            f"Transpiling {len(input_files)} architectures with {workers} workers..."
+        )
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_batch_worker,
+            initargs=(library, options),
+        ) as executor:
+            results = list(executor.map(run_batch_job, out_dirs.items()))
+
+    failed = [x for x, success in zip(out_dirs, results) if not success]
+    if failed:
+        raise BatchError(
+            f"{len(failed)} of {len(input_files)} architectures failed", failed
+        )
+    logger.success(f"Transpiled {len(input_files)} architectures")
@@ -3,12 +3,24 @@ Utility functions
 """
 
 import os
-import sys
-from typing import Tuple
+from typing import Optional, Tuple
 
 import cerberus
 import yaml
-from loguru import logger
+
+from .errors import ConfigError, SchemaError, TemplateError
+from .tags import SafeLoader
+
+# the Cerberus rules that change the document while it is normalized
+NORMALIZATION_RULES: set[str] = {
+    "coerce",
+    "default",
+    "default_setter",
+    "purge_unknown",
+    "readonly",
+    "rename",
+    "rename_handler",
+}
 
 
 def load_text(path: str) -> str:
@@ -18,45 +30,64 @@ def load_text(path: str) -> str:
     try:
         with open(path, "r", encoding="utf8") as stream:
             return stream.read()
-    except FileNotFoundError:
-        logger.exception(f"'{path}' not found")
-        sys.exit(1)
+    except FileNotFoundError as err:
+        raise ConfigError(f"'{path}' not found", path) from err
 
 
-def load_yaml(path: str, loader: yaml.Loader = yaml.SafeLoader) -> dict:
+def load_yaml(path: str, loader: yaml.Loader = SafeLoader) -> dict:
     """
     Loads a yaml file from path and returns the data as a dict.
     """
     try:
         with open(path, "r", encoding="utf8") as stream:
             return yaml.load(stream, Loader=loader)
-    except FileNotFoundError:
-        logger.exception(f"'{path}' not found")
-        sys.exit(1)
-    except yaml.YAMLError:
-        logger.exception(f"Error parsing '{path}'")
-        sys.exit(1)
+    except FileNotFoundError as err:
+        raise ConfigError(f"'{path}' not found", path) from err
+    except yaml.YAMLError as err:
+        raise ConfigError(f"Error parsing '{path}': {err}", path) from err
 
 
 def validate(
-    data: dict, schema: dict, validator: cerberus.Validator = cerberus.Validator()
+    data: dict,
+    schema: Optional[dict],
+    validator: cerberus.Validator = cerberus.Validator(),
+    normalize: bool = True,
 ) -> tuple[bool, dict]:
     """
     Validates data against a schema.
+
+    If the schema is None, the schema the validator was built with is used, which avoids
+    processing the schema again. Normalization can be skipped for schemas without normalization rules,
+    see `has_normalization_rules`.
     """
     try:
-        success = validator.validate(data, schema)
-    except cerberus.schema.SchemaError:
-        logger.exception("Error parsing schema")
-        sys.exit(1)
+        success = validator.validate(data, schema, normalize=normalize)
+    except cerberus.schema.SchemaError as err:
+        raise SchemaError(f"Error parsing schema: {err}") from err
 
     return (success, validator.errors)
 
 
+def has_normalization_rules(schema: any) -> bool:
+    """
+    Returns whether a schema might contain rules that normalize the document, e.g. `default` or `coerce`
+
+    Properties named like a rule are also counted, which only keeps normalizing.
+    """
+    if isinstance(schema, dict):
+        return any(
+            key in NORMALIZATION_RULES or has_normalization_rules(value)
+            for key, value in schema.items()
+        )
+    if isinstance(schema, list):
+        return any(has_normalization_rules(x) for x in schema)
+    return False
+
+
 def load_yaml_and_validate(
     path: str,
-    schema: dict,
-    loader: yaml.Loader = yaml.SafeLoader,
+    schema: Optional[dict],
+    loader: yaml.Loader = SafeLoader,
     validator: cerberus.Validator = cerberus.Validator(),
 ) -> tuple[bool, dict, dict]:
     """
@@ -69,17 +100,16 @@ def load_yaml_and_validate(
 
 def load_yaml_and_validate_handle_errors(
     path: str,
-    schema: dict,
-    loader: yaml.Loader = yaml.SafeLoader,
+    schema: Optional[dict],
+    loader: yaml.Loader = SafeLoader,
     validator: cerberus.Validator = cerberus.Validator(),
 ) -> dict:
     """
-    Loads a yaml file from path and validates it against a schema while handling the errors.
+    Loads a yaml file from path and validates it against a schema, raising a ConfigError if it is invalid.
     """
     success, errors, data = load_yaml_and_validate(path, schema, loader, validator)
     if not success:
-        logger.error(f"Error parsing '{path}': {errors}")
-        sys.exit(1)
+        raise ConfigError(f"Error parsing '{path}': {errors}", path)
 
     return data
 
@@ -93,8 +123,7 @@ def default_file_from_path(path: str, default_file: str) -> str:
         path = os.path.join(path, default_file)
 
     if not os.path.isfile(path):
-        logger.error(f"Template file {path} does not exist")
-        exit(1)
+        raise TemplateError(f"Template file {path} does not exist")
 
     return path
 
@@ -108,22 +137,37 @@ def default_extension_from_path(path: str, default_ext: str) -> str:
         path = f"{path}{default_ext}"
 
     if not os.path.isfile(path):
-        logger.error(f"Template file {path} does not exist")
-        exit(1)
+        raise TemplateError(f"Template file {path} does not exist")
 
     return path
 
 
 def get_type_occurences(dictionary: dict, search_type: type) -> list[Tuple[str, type]]:
     """
-    Recursively finds all instances of a given type in a dictionary
+    Recursively finds all instances of a given type in a dictionary, including the items of lists
     """
     ref_tags: list[Tuple[str, type]] = []
 
     for name, value in dictionary.items():
-        if isinstance(value, dict):
-            ref_tags.extend(get_type_occurences(value, search_type))
-        if isinstance(value, search_type):
-            ref_tags.append((name, value))
+        ref_tags.extend(get_value_occurences(name, value, search_type))
 
     return ref_tags
+
+
+def get_value_occurences(
+    name: str, value: any, search_type: type
+) -> list[Tuple[str, type]]:
+    """
+    Recursively finds all instances of a given type in the value of the field `name`
+    """
+    if isinstance(value, search_type):
+        return [(name, value)]
+    if isinstance(value, dict):
+        return get_type_occurences(value, search_type)
+    if isinstance(value, list):
+        return [
+            occurence
+            for item in value
+            for occurence in get_value_occurences(name, item, search_type)
+        ]
+    return []
@@ -20,6 +20,8 @@ class ArchitectureValidator(Validator):
 class PropertyValidator(ArchitectureValidator):
     """
     Validates component properties
+
+    Expects the `components` keyword argument: the component index (name -> component) of the architecture.
     """
 
     def __init__(self, *args, **kwargs) -> None:
@@ -27,6 +29,14 @@ class PropertyValidator(ArchitectureValidator):
             self.components = kwargs["components"]
         super(PropertyValidator, self).__init__(*args, **kwargs)
 
+    def use_components(self, components: dict[str, dict]) -> None:
+        """
+        Resolves references with another component index, keeping the compiled schema
+        """
+        self.components = components
+        # the validators of nested properties are created from the config
+        self._config["components"] = components
+
     def _validate_ref_type(self, required_type, field, referenced_component):
         """
         Makes sure that the reference is of the correct type
@@ -37,19 +47,15 @@ class PropertyValidator(ArchitectureValidator):
         if not isinstance(referenced_component, RefTag):
             return
 
-        found: bool = False
-        for component in self.components:
-            if component["name"] == referenced_component.value:
-                found = True
-                typee = component["type"]
-                if typee != required_type:
-                    self._error(
-                        field,
-                        f"Invalid type in component {referenced_component} in field {field}: {typee}, expected {required_type}",
-                    )
-
-        if not found:
+        component = self.components.get(referenced_component.value)
+        if component is None:
             self._error(
                 field,
                 f"No component {referenced_component} found",
             )
+        elif component["type"] != required_type:
+            typee = component["type"]
+            self._error(
+                field,
+                f"Invalid type in component {referenced_component} in field {field}: {typee}, expected {required_type}",
+            )
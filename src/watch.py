@@ -0,0 +1,469 @@
+"""
+Watches the architecture and the templates and re-renders the affected outputs on every change
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Optional
+
+import jinja2
+from loguru import logger
+
+from .architecture import ArchitectureConfig
+from .common import create_environment, load_architecture
+from .errors import MultiformError, log_error
+from .schema import Schema, SchemaRegistry
+from .sink import DirectorySink
+from .template import TemplateDefinition, TemplateRoot
+from .transpiler import (
+    SPECIAL_TEMPLATES,
+    TEMPLATE_ROOT_FILE,
+    collect_jobs,
+    read_template_dir,
+    read_templates,
+    validate_components,
+    write_outputs,
+)
+
+# time without further events after which a batch of changes is processed
+DEBOUNCE_SECONDS: float = 0.1
+
+
+class PollingWatcher:
+    """
+    Detects changes by periodically comparing the modification times of all watched files
+    """
+
+    def __init__(self, paths: list[str], interval: float = 0.5) -> None:
+        self.paths = paths
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self) -> dict[str, tuple[int, int]]:
+        """
+        Returns the modification time and size of every watched file
+        """
+        files: dict[str, tuple[int, int]] = {}
+        for path in self.paths:
+            if os.path.isfile(path):
+                candidates = [path]
+            else:
+                candidates = [
+                    os.path.join(folder, name)
+                    for folder, _, names in os.walk(path)
+                    for name in names
+                ]
+            for file in candidates:
+                try:
+                    stat = os.stat(file)
+                except FileNotFoundError:
+                    continue
+                files[file] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def wait(self) -> set[str]:
+        """
+        Blocks until files changed and returns their paths
+        """
+        while True:
+            time.sleep(self.interval)
+            snapshot = self.scan()
+            changed = {
+                path
+                for path in snapshot.keys() | self.snapshot.keys()
+                if snapshot.get(path) != self.snapshot.get(path)
+            }
+            self.snapshot = snapshot
+            if changed:
+                return changed
+
+    def close(self) -> None:
+        """
+        Stops watching
+        """
+
+
+class InotifyWatcher:
+    """
+    Detects changes with the inotify API of the Linux kernel
+    """
+
+    IN_MODIFY: int = 0x00000002
+    IN_CLOSE_WRITE: int = 0x00000008
+    IN_MOVED_FROM: int = 0x00000040
+    IN_MOVED_TO: int = 0x00000080
+    IN_CREATE: int = 0x00000100
+    IN_DELETE: int = 0x00000200
+    IN_ISDIR: int = 0x40000000
+    MASK: int = (
+        IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    )
+    EVENT: struct.Struct = struct.Struct("iIII")
+
+    def __init__(self, paths: list[str]) -> None:
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.folders: dict[int, str] = {}
+        # watched files are observed through their folder, as editors often replace them
+        self.files: set[str] = {x for x in paths if os.path.isfile(x)}
+        self.trees: list[str] = [x for x in paths if os.path.isdir(x)]
+        for file in self.files:
+            self.add(os.path.dirname(file))
+        for tree in self.trees:
+            for folder, _, _ in os.walk(tree):
+                self.add(folder)
+
+    @staticmethod
+    def available() -> bool:
+        """
+        Returns whether inotify can be used on this system
+        """
+        library = ctypes.util.find_library("c")
+        return (
+            library is not None
+            and hasattr(ctypes.CDLL(library), "inotify_init1")
+            and hasattr(os, "O_CLOEXEC")
+        )
+
+    def add(self, folder: str) -> None:
+        """
+        Starts watching a folder
+        """
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), self.MASK)
+        if wd < 0:
+            logger.warning(f"Could not watch '{folder}'")
+            return
+        self.folders[wd] = folder
+
+    def watched(self, path: str) -> bool:
+        """
+        Returns whether a changed path is relevant
+        """
+        return path in self.files or any(
+            os.path.commonpath([path, x]) == x for x in self.trees
+        )
+
+    def read(self) -> set[str]:
+        """
+        Reads the pending events and returns the paths that changed
+        """
+        buffer = os.read(self.fd, 64 * 1024)
+        changed: set[str] = set()
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = self.EVENT.unpack_from(buffer, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(buffer[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if wd not in self.folders:
+                continue
+            path = os.path.join(self.folders[wd], name)
+            if not self.watched(path):
+                continue
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                for folder, _, _ in os.walk(path):
+                    self.add(folder)
+            changed.add(path)
+        return changed
+
+    def wait(self) -> set[str]:
+        """
+        Blocks until files changed and returns their paths
+        """
+        while True:
+            select.select([self.fd], [], [])
+            changed = self.read()
+            # collect the whole burst of events an editor or a checkout produces
+            while select.select([self.fd], [], [], DEBOUNCE_SECONDS)[0]:
+                changed |= self.read()
+            if changed:
+                return changed
+
+    def close(self) -> None:
+        """
+        Stops watching, closing the inotify file descriptor
+        """
+        os.close(self.fd)
+
+
+def create_watcher(paths: list[str], poll: bool, interval: float):
+    """
+    Creates an inotify based watcher, falling back to polling if inotify is not available
+    """
+    if not poll and InotifyWatcher.available():
+        try:
+            return InotifyWatcher(paths)
+        except OSError as err:
+            logger.warning(f"Falling back to polling, inotify failed: {err}")
+    return PollingWatcher(paths, interval)
+
+
+class WatchSession:
+    """
+    Keeps the schemas, templates and templating engine in memory between renders
+    """
+
+    def __init__(
+        self,
+        input_file: str,
+        template_dir: str,
+        out_dir: str,
+        template_cache: Optional[str],
+        workers: int,
+    ) -> None:
+        self.input_file = os.path.abspath(input_file)
+        self.template_dir = os.path.abspath(template_dir)
+        self.schema_dir = os.path.abspath(str(Schema.SCHEMA_RESOURCES))
+        self.out_dir = out_dir
+        self.template_cache = template_cache
+        self.workers = workers
+
+        self.env: jinja2.Environment = create_environment(template_cache)
+        self.schema_registry: Optional[SchemaRegistry] = None
+        self.root: Optional[TemplateRoot] = None
+        self.template_registry: dict[str, TemplateDefinition] = {}
+        self.special_registry: dict[str, TemplateDefinition] = {}
+        self.architecture: Optional[ArchitectureConfig] = None
+        # the state is replaced before the outputs are rendered, so after a failed update the
+        # outputs can be older than the state and the next update renders everything
+        self.stale: bool = True
+
+    def paths(self) -> list[str]:
+        """
+        Returns the files and folders to watch
+        """
+        paths = self.architecture_files() + [self.template_dir]
+        if os.path.isdir(self.schema_dir):
+            paths.append(self.schema_dir)
+        return paths
+
+    def architecture_files(self) -> list[str]:
+        """
+        Returns the architecture file and the files it includes
+        """
+        if self.architecture is None or not self.architecture.files:
+            return [self.input_file]
+        return [os.path.abspath(x) for x in self.architecture.files]
+
+    def template_folders(self) -> dict[str, str]:
+        """
+        Maps the top level folders of the template directory to the template they contain
+        """
+        folders: dict[str, str] = {
+            template.strip("/").split("/")[0]: template.replace("/", "")
+            for template in self.root["templates"]
+        }
+        for special in SPECIAL_TEMPLATES:
+            folders[self.root[special].strip("/").split("/")[0]] = special
+        return folders
+
+    def load(self) -> None:
+        """
+        Loads everything from scratch and renders all outputs
+        """
+        logger.info("Reading and validating schemas...")
+        self.schema_registry = Schema.load_all()
+        self.root = TemplateRoot.with_schema_registry(
+            os.path.join(self.template_dir, TEMPLATE_ROOT_FILE), self.schema_registry
+        )
+        self.template_registry, self.special_registry = read_templates(
+            self.template_dir, self.root, self.schema_registry
+        )
+        self.architecture = load_architecture(
+            self.input_file, self.schema_registry, workers=self.workers
+        )
+        self.render(None, True)
+        self.stale = False
+
+    def reload_template(self, template_type: str) -> None:
+        """
+        Reads a single template definition again
+        """
+        if template_type in SPECIAL_TEMPLATES:
+            self.special_registry[template_type] = read_template_dir(
+                self.template_dir,
+                template_type,
+                self.root[template_type],
+                self.schema_registry,
+            )
+        else:
+            template = next(
+                x for x in self.root["templates"] if x.replace("/", "") == template_type
+            )
+            self.template_registry[template_type] = read_template_dir(
+                self.template_dir, template_type, template, self.schema_registry
+            )
+
+    def reload_architecture(self) -> Optional[set[str]]:
+        """
+        Reads the architecture again, returning the names of the changed and removed components
+        or None if everything has to be rendered again
+        """
+        previous = self.architecture
+        self.architecture = load_architecture(
+            self.input_file, self.schema_registry, workers=self.workers
+        )
+        if (
+            previous is None
+            or previous.metadata != self.architecture.metadata
+            or previous.platforms() != self.architecture.platforms()
+        ):
+            return None
+
+        return {
+            name
+            for name, component in self.architecture.index.items()
+            if previous.index.get(name) != component
+        } | (set(previous.index) - set(self.architecture.index))
+
+    def render(self, names: Optional[set[str]], specials: bool) -> None:
+        """
+        Renders the components in `names` (all if None) and optionally the special templates
+        """
+        components = [
+            x
+            for x in self.architecture.components()
+            if names is None or x["name"] in names
+        ]
+        platforms = self.architecture.platforms()
+        validate_components(self.architecture, components, self.template_registry)
+        jobs = collect_jobs(self.architecture, platforms, components, specials)
+
+        keep: Optional[set[str]] = None
+        if names is not None or not specials:
+            rendered = {x["name"] for x in components}
+            if specials:
+                rendered |= set(SPECIAL_TEMPLATES)
+            keep = (set(self.architecture.index) | set(SPECIAL_TEMPLATES)) - rendered
+
+        with DirectorySink(self.out_dir, [x["name"] for x in platforms]) as sink:
+            write_outputs(
+                jobs,
+                self.template_registry | self.special_registry,
+                self.env,
+                self.template_cache,
+                sink,
+                self.workers,
+                keep,
+            )
+
+    def update(self, changed: set[str]) -> None:
+        """
+        Re-renders the outputs that are affected by the changed files
+        """
+        root_file = os.path.join(self.template_dir, TEMPLATE_ROOT_FILE)
+        if (
+            self.architecture is None
+            or root_file in changed
+            or any(
+                os.path.commonpath([x, self.schema_dir]) == self.schema_dir
+                for x in changed
+            )
+        ):
+            logger.info("Schemas or template root changed, rendering everything...")
+            self.load()
+            return
+
+        stale, self.stale = self.stale, True
+        names: Optional[set[str]] = set()
+        removed: set[str] = set()
+        specials: bool = False
+
+        folders = self.template_folders()
+        template_types: set[str] = set()
+        for path in changed:
+            if os.path.commonpath([path, self.template_dir]) != self.template_dir:
+                continue
+            folder = os.path.relpath(path, self.template_dir).split(os.sep)[0]
+            if folder in folders:
+                template_types.add(folders[folder])
+        for template_type in template_types:
+            logger.info(f"Template `{template_type}` changed")
+            self.reload_template(template_type)
+            if template_type in SPECIAL_TEMPLATES:
+                specials = True
+            else:
+                names |= {
+                    x["name"]
+                    for x in self.architecture.components()
+                    if x["type"] == template_type
+                }
+
+        if changed & set(self.architecture_files()):
+            logger.info("Architecture changed")
+            changed_components = self.reload_architecture()
+            if changed_components is None:
+                names, specials = None, True
+            else:
+                # components that were removed are pruned by rendering nothing for them
+                removed = changed_components - set(self.architecture.index)
+                names |= changed_components - removed
+
+        if stale:
+            logger.info("The previous update failed, rendering everything...")
+            names, specials = None, True
+        elif names is not None and len(names | removed) == 0 and not specials:
+            logger.info("No outputs are affected")
+            self.stale = False
+            return
+
+        self.render(names, specials)
+        self.stale = False
+
+
+def watch(
+    input_file: str,
+    template_dir: str,
+    out_dir: str,
+    template_cache: Optional[str] = None,
+    workers: int = 1,
+    poll: bool = False,
+    interval: float = 0.5,
+) -> None:
+    """
+    Transpiles the architecture and keeps the outputs up to date until interrupted
+    """
+    session = WatchSession(input_file, template_dir, out_dir, template_cache, workers)
+
+    try:
+        session.load()
+    except MultiformError as err:
+        log_error(err)
+        logger.error("Initial transpilation failed, fix the errors above")
+
+    paths = session.paths()
+    watcher = create_watcher(paths, poll, interval)
+    logger.info(f"Watching for changes with {type(watcher).__name__}...")
+
+    try:
+        while True:
+            changed = watcher.wait()
+            logger.debug(f"Changed: {sorted(changed)}")
+            start = time.perf_counter()
+            try:
+                session.update(changed)
+            except MultiformError as err:
+                # keep the last good outputs
+                log_error(err)
+                logger.error("Transpilation failed, waiting for further changes...")
+                continue
+            logger.success(
+                f"Updated outputs in {(time.perf_counter() - start) * 1000:.0f} ms"
+            )
+            # the architecture can include different files now
+            if session.paths() != paths:
+                watcher.close()
+                paths = session.paths()
+                watcher = create_watcher(paths, poll, interval)
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
@@ -0,0 +1,128 @@
+"""
+Contains the writer that replaces output files atomically, so that interrupted runs never leave partial files
+"""
+
+from __future__ import annotations
+
+import os
+import secrets
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from loguru import logger
+
+# temporary files start with this prefix and are renamed into place once they are complete
+TEMP_PREFIX: str = ".multiform-tmp-"
+# the number of threads that write files in parallel, which mostly wait for the filesystem
+WRITE_THREADS: int = 8
+
+
+def write_file(
+    path: str, data: bytes, mtime: Optional[int] = None, fsync: bool = False
+) -> None:
+    """
+    Writes a file to a temporary file next to it and renames it into place,
+    optionally setting its modification time in nanoseconds
+    """
+    folder, name = os.path.split(path)
+    temp = os.path.join(folder, f"{TEMP_PREFIX}{name}.{secrets.token_hex(4)}")
+    # unlike tempfile, os.open creates the file with the permissions of the umask
+    descriptor = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(data)
+            if fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        if mtime is not None:
+            os.utime(temp, ns=(mtime, mtime))
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+def sync_folder(folder: str) -> None:
+    """
+    Flushes the entries of a folder to disk, which makes the renames into it durable
+    """
+    # folders cannot be opened on windows
+    if os.name == "nt":
+        return
+    descriptor = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def remove_temp_files(folder: str) -> None:
+    """
+    Removes the temporary files a killed run left behind in a folder
+    """
+    if not os.path.isdir(folder):
+        return
+    for name in os.listdir(folder):
+        if name.startswith(TEMP_PREFIX):
+            logger.debug(f"Removing temporary file {name} of an interrupted run")
+            os.remove(os.path.join(folder, name))
+
+
+class AtomicWriter:
+    """
+    Writes files atomically in a bounded pool of threads
+
+    Writes are only guaranteed to be complete after `wait`, and `sync` flushes the renames of
+    all files to disk once at the end instead of after every file. With `fsync`, every file is
+    also flushed to disk before it is renamed, which keeps its contents across power failures.
+    Copies of the writer, e.g. in render worker processes, write in the calling thread.
+    """
+
+    def __init__(self, threads: int = WRITE_THREADS, fsync: bool = False) -> None:
+        self.threads = threads
+        self.fsync = fsync
+        self.pool: Optional[ThreadPoolExecutor] = None
+        self.pending: list[Future] = []
+
+    def __getstate__(self) -> dict:
+        # thread pools cannot be pickled and worker processes already write in parallel
+        return self.__dict__ | {"threads": 0, "pool": None, "pending": []}
+
+    def write(self, path: str, data: bytes, mtime: Optional[int] = None) -> None:
+        """
+        Writes a file atomically, in the background if the writer has threads
+        """
+        if self.threads <= 0:
+            write_file(path, data, mtime, self.fsync)
+            return
+
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(
+                max_workers=self.threads, thread_name_prefix="multiform-write"
+            )
+        self.pending.append(self.pool.submit(write_file, path, data, mtime, self.fsync))
+
+    def wait(self) -> None:
+        """
+        Waits until all files are written, raising the first error of a write
+        """
+        pending, self.pending = self.pending, []
+        for future in pending:
+            future.result()
+
+    def sync(self, folders: list[str]) -> None:
+        """
+        Flushes the given folders to disk
+        """
+        for folder in folders:
+            sync_folder(folder)
+
+    def close(self) -> None:
+        """
+        Stops the threads, dropping the writes that have not started yet
+        """
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+        self.pending = []
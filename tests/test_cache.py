@@ -0,0 +1,20 @@
+"""
+Tests the keys of the render cache
+"""
+
+import datetime
+
+from src.cache import RenderCache
+from src.tags import RefTag
+
+
+def test_context_key_is_canonical() -> None:
+    first = RenderCache.context_key({"a": 1, "b": RefTag("bucket")})
+    second = RenderCache.context_key({"b": RefTag("bucket"), "a": 1})
+    assert first is not None
+    assert first == second
+
+
+def test_context_key_skips_values_without_json_encoding() -> None:
+    assert RenderCache.context_key({"since": datetime.date(2020, 1, 1)}) is None
+    assert RenderCache.context_key({"tags": {"a", "b"}}) is None
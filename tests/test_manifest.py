@@ -0,0 +1,40 @@
+"""
+Tests the statuses the manifest reports for the files of an output directory
+"""
+
+import pathlib
+
+from src.manifest import CREATED, DELETED, UNCHANGED, UPDATED, Manifest
+from src.writer import AtomicWriter
+
+
+def sync(folder: pathlib.Path, files: dict[str, str]) -> dict[str, int]:
+    """
+    Writes the files like a transpilation, returning the summary of the manifest
+    """
+    manifest = Manifest.load(str(folder))
+    writer = AtomicWriter()
+    try:
+        for name, contents in files.items():
+            manifest.record(name, *manifest.sync(name, name, contents, writer))
+        writer.wait()
+    finally:
+        writer.close()
+    manifest.prune()
+    manifest.save()
+    return manifest.summary()
+
+
+def test_statuses(tmp_path: pathlib.Path) -> None:
+    assert sync(tmp_path, {"a.tf": "a", "b.tf": "b"})[CREATED] == 2
+
+    summary = sync(tmp_path, {"a.tf": "a", "b.tf": "changed"})
+    assert (summary[UNCHANGED], summary[UPDATED]) == (1, 1)
+
+    # a file that was deleted by hand is created again
+    (tmp_path / "a.tf").unlink()
+    summary = sync(tmp_path, {"a.tf": "a", "b.tf": "changed"})
+    assert (summary[CREATED], summary[UPDATED], summary[UNCHANGED]) == (1, 0, 1)
+
+    (tmp_path / "b.tf").unlink()
+    assert sync(tmp_path, {"a.tf": "a"})[DELETED] == 0
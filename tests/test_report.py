@@ -0,0 +1,56 @@
+"""
+Tests the report of a transpilation
+"""
+
+import json
+import os
+import pathlib
+
+import pytest
+import yaml
+
+from src.session import Multiform, TranspileOptions
+
+TEMPLATES: str = "example/templates"
+
+
+@pytest.mark.parametrize("report_format", ["yaml", "jsonl"])
+def test_debug_report_with_date_property(
+    tmp_path: pathlib.Path, report_format: str
+) -> None:
+    architecture = tmp_path / "architecture.yaml"
+    architecture.write_text(
+        """kind: Architecture
+metadata:
+  name: test
+spec:
+  platforms:
+    - name: aws
+      properties:
+        region: us-east-1
+        since: 2020-01-01
+  components:
+    - name: bucket
+      type: object-storage
+      properties:
+        uniqueName: bucket
+""",
+        encoding="utf8",
+    )
+    out_dir = tmp_path / "out"
+
+    Multiform(TEMPLATES).transpile(
+        [str(architecture)],
+        str(out_dir),
+        TranspileOptions(report=True, debug=True, report_format=report_format),
+    )
+
+    path = os.path.join(out_dir, f"report.{report_format}")
+    with open(path, "r", encoding="utf8") as file:
+        if report_format == "yaml":
+            records = list(yaml.safe_load_all(file))
+        else:
+            records = [json.loads(x) for x in file]
+    properties = [x for x in records if x["kind"] == "properties"]
+    assert len(properties) >= 1
+    assert all(str(x["properties"]["since"]) == "2020-01-01" for x in properties)
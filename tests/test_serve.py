@@ -0,0 +1,88 @@
+"""
+Tests the responses of the render service
+"""
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Iterator
+
+import pytest
+
+from src.serve import RenderServer
+from src.session import Multiform
+
+TEMPLATES: str = "example/templates"
+
+
+@pytest.fixture(scope="module")
+def server() -> Iterator[RenderServer]:
+    server = RenderServer(("127.0.0.1", 0), Multiform(TEMPLATES), 2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server: RenderServer, architecture: dict) -> tuple[int, dict]:
+    """
+    Posts an architecture as JSON, returning the status code and the JSON body
+    """
+    host, port = server.server_address
+    request = urllib.request.Request(
+        f"http://{host}:{port}/render?format=json",
+        json.dumps(architecture).encode("utf8"),
+        {"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as err:
+        return err.code, json.load(err)
+
+
+def architecture(component: dict) -> dict:
+    """
+    Returns an architecture with a single platform and component
+    """
+    return {
+        "kind": "Architecture",
+        "metadata": {"name": "test"},
+        "spec": {
+            "platforms": [{"name": "aws", "properties": {"region": "us-east-1"}}],
+            "components": [component],
+        },
+    }
+
+
+def test_component_with_null_properties(server: RenderServer) -> None:
+    status, body = post(
+        server,
+        architecture({"name": "bucket", "type": "object-storage", "properties": None}),
+    )
+    assert status == 400
+    assert "uniqueName" in body["errors"][0]
+
+
+def test_unexpected_error(
+    server: RenderServer, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def fail(*args) -> None:
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(server.session, "render", fail)
+    status, body = post(
+        server, architecture({"name": "bucket", "type": "object-storage"})
+    )
+    assert status == 500
+    assert "boom" in body["error"]
+    # the request is recorded after the response was sent
+    deadline = time.monotonic() + 5
+    while (
+        server.metrics.requests[("/render", 500)] == 0 and time.monotonic() < deadline
+    ):
+        time.sleep(0.01)
+    assert server.metrics.requests[("/render", 500)] == 1
@@ -0,0 +1,58 @@
+"""
+Tests the validation of architectures that omit optional properties
+"""
+
+import pytest
+
+from src.errors import ArchitectureError
+from src.session import Multiform
+
+TEMPLATES: str = "example/templates"
+
+
+@pytest.fixture(scope="module")
+def session() -> Multiform:
+    return Multiform(TEMPLATES)
+
+
+def architecture(platform: dict, component: dict) -> dict:
+    """
+    Returns an architecture with a single platform and component
+    """
+    return {
+        "kind": "Architecture",
+        "metadata": {"name": "test"},
+        "spec": {"platforms": [platform], "components": [component]},
+    }
+
+
+def test_component_without_properties(session: Multiform) -> None:
+    config = architecture(
+        {"name": "aws", "properties": {"region": "us-east-1"}},
+        {"name": "bucket", "type": "object-storage"},
+    )
+    with pytest.raises(ArchitectureError) as err:
+        session.jobs(config)
+    assert len(err.value.errors) == 1
+    assert "uniqueName" in err.value.errors[0]
+
+
+def test_component_with_null_properties(session: Multiform) -> None:
+    config = architecture(
+        {"name": "aws", "properties": {"region": "us-east-1"}},
+        {"name": "bucket", "type": "object-storage", "properties": None},
+    )
+    with pytest.raises(ArchitectureError) as err:
+        session.jobs(config)
+    assert "uniqueName" in err.value.errors[0]
+
+
+def test_platform_without_properties(session: Multiform) -> None:
+    config = architecture(
+        {"name": "aws"},
+        {"name": "bucket", "type": "object-storage", "properties": {"uniqueName": "x"}},
+    )
+    jobs = session.jobs(config)
+    bucket = next(x for x in jobs if x.name == "bucket")
+    assert bucket.data["uniqueName"] == "x"
+    assert bucket.data["resourceId"] == "bucket"
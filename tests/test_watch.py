@@ -0,0 +1,35 @@
+"""
+Tests the incremental updates of the watch mode
+"""
+
+import pathlib
+import shutil
+
+import pytest
+
+from src.errors import MultiformError
+from src.watch import WatchSession
+
+TEMPLATES: str = "example/templates"
+ARCHITECTURE: str = "example/architecture.yaml"
+
+
+def test_update_after_failed_update(tmp_path: pathlib.Path) -> None:
+    architecture = tmp_path / "architecture.yaml"
+    shutil.copy(ARCHITECTURE, architecture)
+    contents = architecture.read_text(encoding="utf8")
+    session = WatchSession(str(architecture), TEMPLATES, str(tmp_path / "out"), None, 1)
+    session.load()
+
+    # one valid and one invalid change in the same save
+    renamed = contents.replace("23423455-static-web-files", "renamed-bucket")
+    architecture.write_text(
+        renamed.replace("language: javascript", "language: cobol"), encoding="utf8"
+    )
+    with pytest.raises(MultiformError):
+        session.update({str(architecture)})
+
+    architecture.write_text(renamed, encoding="utf8")
+    session.update({str(architecture)})
+    output = tmp_path / "out" / "aws" / "frontend.tf"
+    assert "renamed-bucket" in output.read_text(encoding="utf8")